@@ -0,0 +1,297 @@
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+from queue import PriorityQueue, Queue
+from typing import List, Callable, Dict, Optional, Tuple
+
+import networkx as nx
+
+from src.algorithms import BfsAlgorithm, AStarAlgorithm, EXPANSION_DUPLICATE_DETECTION, \
+    GENERATION_DUPLICATE_DETECTION
+from src.fill_zone.heuristics import ColorCountHeuristic, CombinationHeuristic, EccentricityHeuristic, \
+    LayeredHeuristic, LookaheadHeuristic
+from src.fill_zone.data_structures import Node
+from src.fill_zone.state import FillZoneGraphState, FillZoneBitboardState, FillZoneSharedState, \
+    matrix_to_graph, matrix_to_regions
+from src.frontier import HeapFrontier
+from src.heuristics import DummyHeuristic
+from src.search_tree import SearchTree, STNode
+from src.state import State
+
+SEED = 42
+BOARD_COUNT = 10
+BOARD_SIZE = 6
+COLOR_COUNT = 4
+STATES_PER_BOARD = 300
+MEMORY_BOARD_SIZE = 8
+MEMORY_COLOR_COUNT = 6
+MEMORY_STATES = 5000
+FRONTIER_NODES = 50000
+HEURISTIC_BOARD_SIZE = 7
+HEURISTIC_COLOR_COUNT = 5
+NODE_MEMORY_NODES = 100000
+LABELLING_BOARD_SIZES = [50, 100, 200]
+LABELLING_COLOR_COUNT = 6
+
+
+def random_board(rng: random.Random, size: int, colors: int) -> List[List[int]]:
+    return [[rng.randrange(colors) for _ in range(size)] for _ in range(size)]
+
+
+def reachable_states(initial: State, count: int) -> List[State]:
+    """First count states reached by a breadth first walk, duplicates included, like a search would meet them"""
+    states = [initial]
+    i = 0
+    while len(states) < count and i < len(states):
+        for a in states[i].get_possible_actions():
+            states.append(states[i].apply(a))
+        i += 1
+    return states[:count]
+
+
+class WeisfeilerLehmanKey:
+    """Graph state wrapper hashed and compared like FillZoneGraphState used to be"""
+
+    def __init__(self, state: FillZoneGraphState):
+        self._state = state
+
+    def __eq__(self, other):
+        return nx.utils.graphs_equal(self._state.graph, other._state.graph) and self._state.root == other._state.root
+
+    def __hash__(self):
+        return hash((nx.weisfeiler_lehman_graph_hash(self._state.graph), self._state.root))
+
+
+def time_visited_set(keys: List[object]) -> float:
+    """Time of the membership checks and insertions done by Algorithm.search on its visited set"""
+    start_time = time.perf_counter()
+    visited = set()
+    for k in keys:
+        if k in visited:
+            continue
+        visited.add(k)
+    return time.perf_counter() - start_time
+
+
+def benchmark_state_hashing():
+    rng = random.Random(SEED)
+    before = 0.0
+    after = 0.0
+    lookups = 0
+    for _ in range(BOARD_COUNT):
+        states = reachable_states(FillZoneGraphState(random_board(rng, BOARD_SIZE, COLOR_COUNT)), STATES_PER_BOARD)
+        lookups += len(states)
+        before += time_visited_set([WeisfeilerLehmanKey(s) for s in states])
+        after += time_visited_set(states)
+
+    print(f"visited set over {lookups} states ({BOARD_COUNT} random {BOARD_SIZE}x{BOARD_SIZE} boards, "
+          f"{COLOR_COUNT} colors)")
+    print(f"  weisfeiler-lehman hash: {before:.4f}s ({before / lookups * 1e6:.1f}us per state)")
+    print(f"  canonical key:          {after:.4f}s ({after / lookups * 1e6:.1f}us per state)")
+    print(f"  speedup: {before / after:.0f}x")
+
+
+def benchmark_state_memory():
+    rng = random.Random(SEED)
+    board = random_board(rng, MEMORY_BOARD_SIZE, MEMORY_COLOR_COUNT)
+    print(f"memory per state over the first {MEMORY_STATES} states of a breadth first walk "
+          f"({MEMORY_BOARD_SIZE}x{MEMORY_BOARD_SIZE} board, {MEMORY_COLOR_COUNT} colors)")
+    for cls in [FillZoneGraphState, FillZoneBitboardState, FillZoneSharedState]:
+        initial = cls(board)
+        tracemalloc.start()
+        states = reachable_states(initial, MEMORY_STATES)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {cls.__name__:<24} {size / len(states):>8.0f} bytes")
+
+
+def time_frontier(nodes: List[STNode], push: Callable[[STNode], None], pop: Callable[[], STNode]) -> float:
+    """Time of pushing every node, popping half of them and pushing them again before draining the frontier"""
+    start_time = time.perf_counter()
+    for n in nodes:
+        push(n)
+    for _ in range(len(nodes) // 2):
+        push(pop())
+    for _ in range(len(nodes)):
+        pop()
+    return time.perf_counter() - start_time
+
+
+def benchmark_frontier():
+    rng = random.Random(SEED)
+    tree = SearchTree(FillZoneBitboardState(random_board(rng, MEMORY_BOARD_SIZE, MEMORY_COLOR_COUNT)),
+                      ColorCountHeuristic())
+    states = reachable_states(tree.get_root().get_state(), FRONTIER_NODES)
+    nodes = [STNode(tree.get_heuristic(), s, rng.randrange(20), None, None) for s in states]
+    operations = 3 * len(nodes)
+
+    queue = Queue()
+    bfs_before = time_frontier(nodes, queue.put, queue.get)
+    bfs_queue = deque()
+    bfs_after = time_frontier(nodes, bfs_queue.append, bfs_queue.popleft)
+
+    priority_queue = PriorityQueue()
+    a_star_before = time_frontier(nodes, lambda n: priority_queue.put((n.get_cost() + n.get_estimate(), n)),
+                                  lambda: priority_queue.get()[1])
+    heap = HeapFrontier()
+    a_star_after = time_frontier(nodes, lambda n: heap.push(n.get_cost() + n.get_estimate(), n), heap.pop)
+
+    print(f"frontier throughput over {operations} operations")
+    print(f"  bfs  queue.Queue:         {operations / bfs_before:>12.0f} ops/s")
+    print(f"  bfs  collections.deque:   {operations / bfs_after:>12.0f} ops/s")
+    print(f"  A*   queue.PriorityQueue: {operations / a_star_before:>12.0f} ops/s")
+    print(f"  A*   HeapFrontier:        {operations / a_star_after:>12.0f} ops/s")
+
+
+class LegacySTNode:
+    """Search tree node laid out like STNode used to be: an instance dict, a reference to the search tree and
+    the set of expanded children"""
+
+    def __init__(self, search_tree: SearchTree, state: State, cost: int, parent, action):
+        self._parent = parent
+        self._action = action
+        self._search_tree = search_tree
+        self._cost = cost
+        self._estimate = None
+        self._state = state
+        self._children = set()
+
+    def __eq__(self, other):
+        return isinstance(other, LegacySTNode) and self._state == other._state
+
+    def __hash__(self):
+        return hash(self._state)
+
+
+def benchmark_node_memory():
+    rng = random.Random(SEED)
+    tree = SearchTree(FillZoneSharedState(random_board(rng, MEMORY_BOARD_SIZE, MEMORY_COLOR_COUNT)),
+                      ColorCountHeuristic())
+    # States, parents and actions of a breadth first walk built beforehand so that only the nodes are measured
+    walk = [(tree.get_root().get_state(), 0, -1, None)]
+    i = 0
+    while len(walk) < NODE_MEMORY_NODES:
+        state, cost = walk[i][:2]
+        for a in state.get_possible_actions():
+            walk.append((state.apply(a), cost + 1, i, a))
+        i += 1
+
+    print(f"memory per generated node over {len(walk)} nodes of a breadth first walk")
+    for name, create in [("before (dict, tree, children)", lambda st, c, p, a: LegacySTNode(tree, st, c, p, a)),
+                         ("after  (__slots__)", lambda st, c, p, a: STNode(tree.get_heuristic(), st, c, p, a))]:
+        tracemalloc.start()
+        nodes = []
+        for state, cost, parent_index, action in walk:
+            parent = nodes[parent_index] if parent_index >= 0 else None
+            node = create(state, cost, parent, action)
+            if isinstance(parent, LegacySTNode):
+                parent._children.add(node)
+            nodes.append(node)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {name:<32} {(size - sys.getsizeof(nodes)) / len(nodes):>8.0f} bytes")
+
+
+def benchmark_duplicate_detection():
+    rng = random.Random(SEED)
+    boards = [random_board(rng, BOARD_SIZE, COLOR_COUNT) for _ in range(BOARD_COUNT)]
+    print(f"totals over {BOARD_COUNT} random {BOARD_SIZE}x{BOARD_SIZE} boards, {COLOR_COUNT} colors")
+    print(f"  {'':<16}{'policy':<12}{'expanded':>10}{'generated':>11}{'frontier':>10}{'time':>9}")
+    for algorithm_class, heuristic in [(BfsAlgorithm, DummyHeuristic()), (AStarAlgorithm, CombinationHeuristic())]:
+        for policy in [EXPANSION_DUPLICATE_DETECTION, GENERATION_DUPLICATE_DETECTION]:
+            expanded = generated = frontier = 0
+            start_time = time.perf_counter()
+            for board in boards:
+                result = SearchTree(FillZoneBitboardState(board), heuristic).search(algorithm_class(policy))
+                expanded += result.expanded_nodes
+                generated += result.generated_nodes
+                frontier += result.frontier_nodes
+            elapsed = time.perf_counter() - start_time
+            print(f"  {algorithm_class.__name__:<16}{policy:<12}{expanded:>10}{generated:>11}{frontier:>10}"
+                  f"{elapsed:>8.2f}s")
+
+
+def benchmark_heuristics():
+    rng = random.Random(SEED)
+    boards = [random_board(rng, HEURISTIC_BOARD_SIZE, HEURISTIC_COLOR_COUNT) for _ in range(BOARD_COUNT)]
+    heuristics = [EccentricityHeuristic(), ColorCountHeuristic(), CombinationHeuristic(), LayeredHeuristic(),
+                  LookaheadHeuristic()]
+    print(f"A* totals over {BOARD_COUNT} random {HEURISTIC_BOARD_SIZE}x{HEURISTIC_BOARD_SIZE} boards, "
+          f"{HEURISTIC_COLOR_COUNT} colors, seed {SEED}")
+    print(f"  {'heuristic':<24}{'cost':>6}{'expanded':>10}{'time':>9}{'us/node':>9}")
+    for heuristic in heuristics:
+        cost = expanded = 0
+        start_time = time.perf_counter()
+        for board in boards:
+            result = SearchTree(FillZoneBitboardState(board), heuristic).search(AStarAlgorithm())
+            cost += result.cost
+            expanded += result.expanded_nodes
+        elapsed = time.perf_counter() - start_time
+        print(f"  {heuristic.__class__.__name__:<24}{cost:>6}{expanded:>10}{elapsed:>8.2f}s"
+              f"{elapsed / expanded * 1e6:>9.0f}")
+
+
+def legacy_matrix_to_graph(matrix: List[List[int]]) -> Tuple[Node, nx.Graph]:
+    """Region graph built like matrix_to_graph used to: a flood fill over a queue.Queue, one cell at a time, adding
+    the edges to the graph one by one"""
+    nodes: List[List[Optional[Node]]] = [[None] * len(matrix[0]) for _ in matrix]
+    node_id = 1
+    g = nx.Graph()
+    for i in range(len(matrix)):
+        for j in range(len(matrix[0])):
+            if nodes[i][j] is not None:
+                continue
+            curr_node = Node(matrix[i][j], node_id)
+            node_id += 1
+            nodes[i][j] = curr_node
+            q: Queue = Queue(maxsize=0)
+            q.put((i, j))
+            while not q.empty():
+                i2, j2 = q.get()
+                for di, dj in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
+                    ni, nj = i2 + di, j2 + dj
+                    if not (0 <= ni < len(matrix) and 0 <= nj < len(matrix[0])):
+                        continue
+                    if matrix[ni][nj] == curr_node.color and nodes[ni][nj] is None:
+                        q.put((ni, nj))
+                        nodes[ni][nj] = curr_node
+                    elif matrix[ni][nj] != curr_node.color and nodes[ni][nj] is not None:
+                        g.add_edge(nodes[ni][nj], curr_node)
+    return nodes[0][0], g
+
+
+def benchmark_labelling():
+    rng = random.Random(SEED)
+    # numpy is imported on first use, outside of the measurements
+    matrix_to_regions([[0]])
+    print(f"time to label the regions of a random board, {LABELLING_COLOR_COUNT} colors")
+    print(f"  {'size':<10}{'queue flood fill':>18}{'numpy graph':>13}{'numpy regions':>15}")
+    for size in LABELLING_BOARD_SIZES:
+        board = random_board(rng, size, LABELLING_COLOR_COUNT)
+        times = []
+        for build in [legacy_matrix_to_graph, matrix_to_graph, matrix_to_regions]:
+            start_time = time.perf_counter()
+            build(board)
+            times.append(time.perf_counter() - start_time)
+        print(f"  {f'{size}x{size}':<10}{times[0]:>17.3f}s{times[1]:>12.3f}s{times[2]:>14.3f}s")
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "hashing": benchmark_state_hashing,
+    "memory": benchmark_state_memory,
+    "frontier": benchmark_frontier,
+    "nodes": benchmark_node_memory,
+    "duplicates": benchmark_duplicate_detection,
+    "heuristics": benchmark_heuristics,
+    "labelling": benchmark_labelling,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] if len(sys.argv) > 1 else list(BENCHMARKS.keys())
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark {name}, options: {', '.join(BENCHMARKS.keys())}")
+            exit(1)
+        BENCHMARKS[name]()
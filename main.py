@@ -1,36 +1,99 @@
+import argparse
 import json
 import logging
 import sys
-from typing import Tuple, List
+import time
+from typing import Tuple, List, Iterable, TextIO, Dict, Iterator, Optional
 
-import numpy as np
-
-from src.algorithms import BfsAlgorithm, DfsAlgorithm, GreedyAlgorithm, AStarAlgorithm
+from src.algorithms import BfsAlgorithm, DfsAlgorithm, GreedyAlgorithm, AStarAlgorithm, \
+    WeightedAStarAlgorithm, AraStarAlgorithm, BeamSearchAlgorithm, IddfsAlgorithm, IdaStarAlgorithm, \
+    BidirectionalBfsAlgorithm, BidirectionalAStarAlgorithm, EXPANSION_DUPLICATE_DETECTION
+from src.action import Action
+from src.board_parser import generate_fill_zone_board, generate_eight_puzzle_board
+from src.budget import SearchBudget
+from src.fill_zone.action import FillZoneAction
+from src.fill_zone.algorithms import LookaheadGreedyAlgorithm, REGIONS_SCORE
 from src.fill_zone.heuristics import ColorCountHeuristic, EccentricityHeuristic, CombinationHeuristic, \
-    NodeCountHeuristic
-from src.fill_zone.state import FillZoneGraphState
-from src.heuristics import DummyHeuristic
-from src.result import Result
+    NodeCountHeuristic, LayeredHeuristic, LookaheadHeuristic
+from src.fill_zone.state import FillZoneGraphState, FillZoneBitboardState, FillZoneSharedState
+from src.hda_star import HdaStarAlgorithm
+from src.heuristics import DummyHeuristic, CachedHeuristic, Heuristic
+from src.parallel import ParallelSolver, TaskOutcome, TASK_ERROR
+from src.result import Result, SOLVED
 from src.search_tree import SearchTree
 from src.state import State
-from src.eight_puzzle.state import EightPuzzleMatrixState
-from src.eight_puzzle.heuristics import OutOfPlaceHeuristic, ManhattanHeuristic
+from src.eight_puzzle.state import EightPuzzleMatrixState, EightPuzzlePackedState
+from src.eight_puzzle.heuristics import OutOfPlaceHeuristic, ManhattanHeuristic, PatternDatabaseHeuristic, \
+    DEFAULT_PATTERN_DATABASE_DIR
 
 
 def get_algorithm(search_settings):
+    duplicate_detection = search_settings.get("duplicate_detection", EXPANSION_DUPLICATE_DETECTION)
     match search_settings["algorithm"]:
         case "bfs":
-            return BfsAlgorithm()
+            return BfsAlgorithm(duplicate_detection)
+        case "external_bfs":
+            # Built on numpy memory mapped files, only loaded when used
+            from src.external_bfs import ExternalBfsAlgorithm
+            return ExternalBfsAlgorithm(search_settings.get("scratch_dir"), search_settings.get("chunk_size", 1 << 18))
         case "dfs":
-            return DfsAlgorithm()
+            return DfsAlgorithm(duplicate_detection)
         case "greedy":
-            return GreedyAlgorithm()
+            return GreedyAlgorithm(duplicate_detection)
         case "A*":
-            return AStarAlgorithm()
+            return AStarAlgorithm(duplicate_detection)
+        case "weighted_A*":
+            return WeightedAStarAlgorithm(search_settings.get("weight", 2), duplicate_detection)
+        case "ara*":
+            return AraStarAlgorithm(search_settings.get("initial_weight", 3), search_settings.get("weight_step", 0.5))
+        case "beam":
+            return BeamSearchAlgorithm(search_settings.get("beam_width", 100))
+        case "iddfs":
+            return IddfsAlgorithm(search_settings.get("check_cycles", True))
+        case "ida*":
+            return IdaStarAlgorithm(search_settings.get("check_cycles", True))
+        case "hda*":
+            return HdaStarAlgorithm(search_settings.get("workers"))
+        case "bidirectional_bfs":
+            return BidirectionalBfsAlgorithm()
+        case "bidirectional_A*":
+            return BidirectionalAStarAlgorithm()
+        case "lookahead_greedy":
+            return LookaheadGreedyAlgorithm(search_settings.get("lookahead_depth", 2),
+                                            search_settings.get("lookahead_score", REGIONS_SCORE))
         case _:
             raise ValueError("Unsupported search algorithm")
 
 
+# Algorithms that keep the states as their State.get_record records
+RECORD_ALGORITHMS = ["external_bfs", "hda*"]
+
+
+def check_record_state(search_settings, state: str, record_states: List[str]):
+    """Raises ValueError if the algorithm needs state records and the state representation has none"""
+    if search_settings["algorithm"] in RECORD_ALGORITHMS and state not in record_states:
+        raise ValueError(f"{search_settings['algorithm']} needs the {' or '.join(record_states)} state, "
+                         f"not {state}")
+
+
+def get_fill_zone_algorithm(search_settings, board_settings):
+    # The bidirectional searches also search back from the goal, and a Fill Zone state can not be reversed
+    if search_settings["algorithm"] in ["bidirectional_bfs", "bidirectional_A*"]:
+        raise ValueError(f"{search_settings['algorithm']} is only supported for the 8-puzzle")
+    check_record_state(search_settings, board_settings.get("state", "graph"), ["bitboard", "shared"])
+    return get_algorithm(search_settings)
+
+
+def get_eight_puzzle_algorithm(search_settings, board_settings):
+    check_record_state(search_settings, board_settings.get("state", "matrix"), ["packed"])
+    return get_algorithm(search_settings)
+
+
+def get_budget(search_settings) -> SearchBudget:
+    return SearchBudget(search_settings.get("max_expanded"), search_settings.get("max_frontier"),
+                        search_settings.get("max_seconds"), search_settings.get("max_memory_mb"))
+
+
 def get_fill_zone_heuristic(search_settings):
     if "heuristic" not in search_settings:
         return DummyHeuristic()
@@ -44,6 +107,10 @@ def get_fill_zone_heuristic(search_settings):
             return CombinationHeuristic()
         case "node_count":
             return NodeCountHeuristic()
+        case "layered":
+            return LayeredHeuristic()
+        case "lookahead":
+            return LookaheadHeuristic()
         case _:
             return DummyHeuristic()
 
@@ -57,72 +124,259 @@ def get_eight_puzzle_heuristic(search_settings):
             return OutOfPlaceHeuristic()
         case "manhattan":
             return ManhattanHeuristic()
+        case "pdb":
+            return PatternDatabaseHeuristic(search_settings.get("pdb_patterns"),
+                                            search_settings.get("pdb_cache_dir", DEFAULT_PATTERN_DATABASE_DIR))
         case _:
             return DummyHeuristic()
 
 
-def generate_fill_zone_board(board_settings):
-    match board_settings["type"]:
-        case "static":
-            return np.mat(board_settings["board"]).tolist()
-        case "random":
-            n = board_settings["board_size"]
-            m = board_settings["color_count"]
-            return np.random.randint(0, m, (n, n))
+def with_cache(search_settings, heuristic: Heuristic) -> Heuristic:
+    if "heuristic_cache_size" not in search_settings:
+        return heuristic
+    return CachedHeuristic(heuristic, search_settings["heuristic_cache_size"])
+
+
+def print_result(result: Result):
+    if result.status != SOLVED:
+        print("search stopped: ", result.status)
+    if result.partial_solution is not None:
+        print("partial solution: ", result.partial_solution)
+    print("expanded nodes: ", result.expanded_nodes)
+    print("generated nodes: ", result.generated_nodes)
+    print("solution found: ", result.solution)
+    print("cost of solution: ", result.cost)
+    print("nodes on frontier: ", result.frontier_nodes)
+    if result.first_solution_time is not None:
+        print("time to first solution: ", result.first_solution_time)
+    if result.suboptimality_bound is not None:
+        print("suboptimality bound: ", result.suboptimality_bound)
+    if result.worker_expanded_nodes is not None:
+        print("expanded nodes per worker: ", result.worker_expanded_nodes)
+        mean = sum(result.worker_expanded_nodes) / len(result.worker_expanded_nodes)
+        if mean > 0:
+            # How much longer the busiest worker worked than it would with a perfect split
+            print("load imbalance: ", max(result.worker_expanded_nodes) / mean)
+    if result.cache_hits + result.cache_misses > 0:
+        print("heuristic cache hits: ", result.cache_hits)
+        print("heuristic cache misses: ", result.cache_misses)
+
+
+def run_search(search_tree: SearchTree, algorithm):
+    if not isinstance(algorithm, AraStarAlgorithm):
+        print_result(search_tree.search(algorithm))
+        return
+
+    # Anytime search, every improved solution is printed as soon as it is found
+    found = False
+    for result in search_tree.solutions(algorithm):
+        found = True
+        print_result(result)
+        print(flush=True)
+    if not found:
+        print("no solution found within the search budget")
+
+
+def get_fill_zone_state(board_settings, matrix: List[List[int]]) -> State:
+    match board_settings.get("state", "graph"):
+        case "graph":
+            return FillZoneGraphState(matrix)
+        case "bitboard":
+            return FillZoneBitboardState(matrix)
+        case "shared":
+            return FillZoneSharedState(matrix)
         case _:
-            raise ValueError("Unsupported board generation method")
+            raise ValueError("Unsupported state representation")
 
 
-# TODO: support more board creation settings
-def generate_eight_puzzle_board(board_settings) -> Tuple[List[List[int]], List[List[int]]]:
-    return np.mat(board_settings["board"]).tolist(), np.mat(board_settings["goal"]).tolist()
+def get_eight_puzzle_state(board_settings, board: List[List[int]], goal: List[List[int]]) -> State:
+    match board_settings.get("state", "matrix"):
+        case "matrix":
+            return EightPuzzleMatrixState(board, goal)
+        case "packed":
+            return EightPuzzlePackedState(board, goal)
+        case _:
+            raise ValueError("Unsupported state representation")
 
 
 def run_fill_zone(config):
     board_settings = config["board_settings"]
 
     a = generate_fill_zone_board(board_settings)
-    g: State = FillZoneGraphState(a)
+    g: State = get_fill_zone_state(board_settings, a)
 
     search_settings = config["search_settings"]
-    algorithm = get_algorithm(search_settings)
-    heuristic = get_fill_zone_heuristic(search_settings)
+    algorithm = get_fill_zone_algorithm(search_settings, board_settings)
+    algorithm.set_budget(get_budget(search_settings))
+    heuristic = with_cache(search_settings, get_fill_zone_heuristic(search_settings))
 
     search_tree: SearchTree = SearchTree(g, heuristic)
-    result: Result = search_tree.search(algorithm)
-
-    print("expanded nodes: ", result.expanded_nodes)
-    print("solution found: ", result.solution)
-    print("cost of solution: ", result.cost)
-    print("nodes on frontier: ", result.frontier_nodes)
+    run_search(search_tree, algorithm)
 
 
 def run_eight_puzzle(config):
     board_settings = config["board_settings"]
     boards = generate_eight_puzzle_board(board_settings)
-    s: EightPuzzleMatrixState = EightPuzzleMatrixState(boards[0], boards[1])
+    s: State = get_eight_puzzle_state(board_settings, boards[0], boards[1])
     search_settings = config["search_settings"]
-    heuristic = get_eight_puzzle_heuristic(search_settings)
-    algorithm = get_algorithm(search_settings)
+    heuristic = with_cache(search_settings, get_eight_puzzle_heuristic(search_settings))
+    algorithm = get_eight_puzzle_algorithm(search_settings, board_settings)
+    algorithm.set_budget(get_budget(search_settings))
 
     search_tree: SearchTree = SearchTree(s, heuristic)
-    result: Result = search_tree.search(algorithm)
+    run_search(search_tree, algorithm)
 
-    print("expanded nodes: ", result.expanded_nodes)
-    print("solution found: ", result.solution)
-    print("cost of solution: ", result.cost)
-    print("nodes on frontier: ", result.frontier_nodes)
+
+def get_batch_state(config, board) -> State:
+    """Initial state of a batch board, its fields override the board settings of the config"""
+    board_settings = {**config["board_settings"], **board, "type": "static"}
+    match config["game"]:
+        case "fill-zone":
+            return get_fill_zone_state(board_settings, generate_fill_zone_board(board_settings))
+        case "8-puzzle":
+            boards = generate_eight_puzzle_board(board_settings)
+            return get_eight_puzzle_state(board_settings, boards[0], boards[1])
+        case _:
+            raise ValueError("Game type not supported")
+
+
+def action_to_json(action: Action):
+    return action.get_color() if isinstance(action, FillZoneAction) else repr(action)
+
+
+def result_to_json(board_id, result: Result, seconds: float):
+    output = {
+        "id": board_id,
+        "status": result.status,
+        "solution": [action_to_json(a) for a in result.solution],
+        "cost": result.cost,
+        "expanded": result.expanded_nodes,
+        "generated": result.generated_nodes,
+        "frontier": result.frontier_nodes,
+        "time": seconds,
+    }
+    if result.partial_solution is not None:
+        output["partial_solution"] = [action_to_json(a) for a in result.partial_solution]
+    return output
+
+
+class BatchSolver:
+    """Algorithm and heuristic of a config, built once so that pattern databases and other precomputed tables
+    are shared by every board"""
+
+    def __init__(self, config):
+        self._config = config
+        self._search_settings = config["search_settings"]
+        match config["game"]:
+            case "fill-zone":
+                self._algorithm = get_fill_zone_algorithm(self._search_settings, config["board_settings"])
+                self._heuristic = get_fill_zone_heuristic(self._search_settings)
+            case "8-puzzle":
+                self._algorithm = get_eight_puzzle_algorithm(self._search_settings, config["board_settings"])
+                self._heuristic = get_eight_puzzle_heuristic(self._search_settings)
+            case _:
+                raise ValueError("Game type not supported")
+        self._algorithm.set_budget(get_budget(self._search_settings))
+
+    def solve(self, line: str) -> Result:
+        board = json.loads(line)
+        board.pop("id", None)
+        state = get_batch_state(self._config, board)
+        # States of different boards may be equal, so each board gets its own cache
+        return SearchTree(state, with_cache(self._search_settings, self._heuristic)).search(self._algorithm)
+
+
+# Solvers of the worker processes by config
+_worker_solvers: Dict[str, BatchSolver] = {}
+
+
+def solve_batch_task(task: Tuple[str, str]) -> Result:
+    """Solves a batch line in a worker process, the solver of each config is built once per process"""
+    config_json, line = task
+    if config_json not in _worker_solvers:
+        _worker_solvers[config_json] = BatchSolver(json.loads(config_json))
+    return _worker_solvers[config_json].solve(line)
+
+
+def get_board_id(line: str, number: int):
+    try:
+        return json.loads(line).get("id", number)
+    except (ValueError, AttributeError):
+        return number
+
+
+def outcome_to_json(board_id, outcome: TaskOutcome):
+    if outcome.result is None:
+        return {"id": board_id, "status": outcome.status, "error": outcome.error, "time": outcome.seconds}
+    return result_to_json(board_id, outcome.result, outcome.seconds)
+
+
+def solve_sequentially(config, lines: Iterable[str]) -> Iterator[TaskOutcome]:
+    solver = BatchSolver(config)
+    for index, line in enumerate(lines):
+        start_time = time.perf_counter()
+        try:
+            result = solver.solve(line)
+            yield TaskOutcome(index, result, time.perf_counter() - start_time, result.status)
+        except Exception as e:
+            # Like in a ParallelSolver worker, a bad board only fails its own line
+            yield TaskOutcome(index, None, time.perf_counter() - start_time, TASK_ERROR, str(e) or repr(e))
+
+
+def run_batch(config, lines: Iterable[str], out: TextIO, workers: int = 1, ordered: bool = True,
+              task_timeout: Optional[float] = None, max_memory_mb: Optional[float] = None):
+    """Solves every board of a JSONL stream with the algorithm and heuristic of the config, writing each result
+    as a JSONL line as soon as it is found.
+
+    Each line holds a "board" in the format of the board settings, and optionally an "id" that is copied to
+    the result and any other board setting to override, like the "goal" of the 8-puzzle. With more than one
+    worker the boards are solved by a ParallelSolver, which is sent the lines and not the built states, and
+    results come in the order of the lines only if ordered.
+    """
+    # Lines are read as the boards are solved, only the ones without a result yet are kept
+    in_flight: Dict[int, Tuple[int, str]] = {}
+
+    def board_lines() -> Iterator[str]:
+        numbered = ((number, line) for number, line in enumerate(lines) if line.strip())
+        for index, (number, line) in enumerate(numbered):
+            in_flight[index] = (number, line)
+            yield line
+
+    if workers == 1:
+        outcomes = solve_sequentially(config, board_lines())
+    else:
+        config_json = json.dumps(config)
+        solver = ParallelSolver(solve_batch_task, workers, task_timeout, max_memory_mb, ordered)
+        outcomes = solver.run((config_json, line) for line in board_lines())
+
+    for outcome in outcomes:
+        number, line = in_flight.pop(outcome.index)
+        out.write(json.dumps(outcome_to_json(get_board_id(line, number), outcome)) + "\n")
+        out.flush()
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Config file argument not found")
-        exit(1)
-    config_path = sys.argv[1]
-    with open(config_path, "r") as f:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config_file")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="BOARDS_FILE",
+                        help="solve the boards of a JSONL file, or of stdin if not given or -")
+    parser.add_argument("--workers", type=int, default=1, help="processes solving batch boards in parallel")
+    parser.add_argument("--unordered", action="store_true", help="write batch results as soon as they finish")
+    parser.add_argument("--task-timeout", type=float, help="seconds after which a batch worker is killed")
+    parser.add_argument("--task-memory-mb", type=float, help="memory each batch worker may allocate")
+    args = parser.parse_args()
+
+    with open(args.config_file, "r") as f:
         config = json.load(f)
     logging.basicConfig(level=logging.getLevelName(config["logging_level"]))
 
+    if args.batch is not None:
+        batch_args = (args.workers, not args.unordered, args.task_timeout, args.task_memory_mb)
+        if args.batch != "-":
+            with open(args.batch, "r") as f:
+                return run_batch(config, f, sys.stdout, *batch_args)
+        return run_batch(config, sys.stdin, sys.stdout, *batch_args)
+
     match config["game"]:
         case "fill-zone":
             return run_fill_zone(config)
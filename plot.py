@@ -1,26 +1,33 @@
-import os.path
+import os
 import tracemalloc
 import time
 from abc import ABC
+from concurrent.futures import ProcessPoolExecutor
 from numbers import Number
 from typing import List, Dict, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
 
-from src.algorithms import BfsAlgorithm, DfsAlgorithm, GreedyAlgorithm, AStarAlgorithm, Algorithm
+from src.algorithms import BfsAlgorithm, DfsAlgorithm, GreedyAlgorithm, AStarAlgorithm, Algorithm, IddfsAlgorithm, \
+    IdaStarAlgorithm
+from src.budget import SearchBudget, MAX_SECONDS
 from src.fill_zone.heuristics import EccentricityHeuristic, ColorCountHeuristic, CombinationHeuristic, \
     NodeCountHeuristic
 from src.fill_zone.state import FillZoneGraphState
 from src.heuristics import DummyHeuristic, Heuristic
-from src.result import Result
 from src.search_tree import SearchTree
-from src.state import State
 
 OUTPUT_DIR = "figs/"
 M = 5
 N = 5
 TEST_COUNT = 100
+SEED = 42
+# Seconds after which a search is stopped and left out of the plots
+JOB_TIMEOUT = 60
+# Seconds after which the second run of a search, tracing its memory, is stopped as tracing slows it down
+TRACED_JOB_TIMEOUT = 4 * JOB_TIMEOUT
+WORKERS = os.cpu_count()
 UNINFORMED_ALGOS = [
     BfsAlgorithm(),
     DfsAlgorithm()
@@ -52,7 +59,9 @@ NOT_OPTIMAL_PAIRS = [
 MEMORY_ANAL = [
     (BfsAlgorithm(), DummyHeuristic()),
     (DfsAlgorithm(), DummyHeuristic()),
-    (AStarAlgorithm(), CombinationHeuristic())
+    (AStarAlgorithm(), CombinationHeuristic()),
+    (IddfsAlgorithm(), DummyHeuristic()),
+    (IdaStarAlgorithm(), CombinationHeuristic())
 ]
 
 
@@ -64,30 +73,73 @@ def _get_key(algoheu: Tuple[Algorithm, Heuristic]) -> str:
     return f"{_get_alias(algoheu[0])}+{_get_alias(algoheu[1])}"
 
 
+class Measurement:
+    """Everything the plots need from a single search"""
+
+    def __init__(self, key: str, seconds: float, expanded_nodes: int, frontier_nodes: int, peak_memory: int,
+                 timed_out: bool):
+        self.key = key
+        self.seconds = seconds
+        self.expanded_nodes = expanded_nodes
+        self.frontier_nodes = frontier_nodes
+        self.peak_memory = peak_memory
+        self.timed_out = timed_out
+
+
+def run_job(job: Tuple[List[List[int]], Algorithm, Heuristic, bool]) -> Measurement:
+    """Solves a board in a worker process. With trace_memory it is solved once more tracing the memory
+    allocations, as the tracing slows the search down several times. A search that times out in either run is
+    marked as timed out"""
+    b, a, heuristic, trace_memory = job
+    a.set_budget(SearchBudget(max_seconds=JOB_TIMEOUT))
+    search_tree = SearchTree(FillZoneGraphState(b), heuristic)
+    start_time = time.perf_counter()
+    res = search_tree.search(a)
+    seconds = time.perf_counter() - start_time
+    timed_out = res.status == MAX_SECONDS
+
+    peak = 0
+    if trace_memory and not timed_out:
+        search_tree = SearchTree(FillZoneGraphState(b), heuristic)
+        a.set_budget(SearchBudget(max_seconds=TRACED_JOB_TIMEOUT))
+        tracemalloc.start()
+        traced = search_tree.search(a)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timed_out = traced.status == MAX_SECONDS
+    return Measurement(_get_key((a, heuristic)), seconds, res.expanded_nodes, res.frontier_nodes, peak, timed_out)
+
+
+def run_benchmark(algoheus: List[Tuple[Algorithm, Heuristic]]) -> Dict[str, List[Measurement]]:
+    """Runs every pair once over the same TEST_COUNT boards, generated from SEED, in a pool of processes"""
+    rng = np.random.default_rng(SEED)
+    boards: List[List[List[int]]] = [rng.integers(0, M, (N, N)).tolist() for _ in range(TEST_COUNT)]
+    # Only the pairs in the memory plot pay for a second, traced run
+    memory_keys = {_get_key(algoheu) for algoheu in MEMORY_ANAL}
+    jobs = [(b, algoheu[0], algoheu[1], _get_key(algoheu) in memory_keys) for b in boards for algoheu in algoheus]
+
+    measurements: Dict[str, List[Measurement]] = {_get_key(algoheu): [] for algoheu in algoheus}
+    with ProcessPoolExecutor(WORKERS) as executor:
+        for measurement in executor.map(run_job, jobs):
+            measurements[measurement.key].append(measurement)
+    return measurements
+
+
 class PlotSupplier(ABC):
 
     def __init__(self, out_name: str):
         self._out_name = out_name
 
-    def plot(self):
-        data = self._create_data()
-
-        for t in range(TEST_COUNT):
-            self._add_data(data, self._get_new_data())
+    def plot(self, measurements: Dict[str, List[Measurement]]):
+        data = self._create_data(measurements)
 
         data = self._post_process(data)
 
         self._save_plot(data)
 
-    def _create_data(self):
-        raise NotImplementedError()
-
-    def _get_new_data(self):
+    def _create_data(self, measurements: Dict[str, List[Measurement]]):
         raise NotImplementedError()
 
-    def _add_data(self, data, new_data):
-        raise NotImplementedError
-
     def _post_process(self, data):
         raise NotImplementedError()
 
@@ -101,28 +153,19 @@ class BarPlotSupplier(PlotSupplier, ABC):
         self._algoheus = algoheus
         self._yaxis_name = yaxis_name
 
-    def _create_data(self):
+    def get_algoheus(self) -> List[Tuple[Algorithm, Heuristic]]:
+        return self._algoheus
+
+    def _create_data(self, measurements: Dict[str, List[Measurement]]):
         data: Dict[str, List[Number]] = {}
         for algoheu in self._algoheus:
-            data[_get_key(algoheu)] = []
+            key = _get_key(algoheu)
+            data[key] = [self._get_useful_data(m) for m in measurements[key] if not m.timed_out]
         return data
 
-    def _get_new_data(self) -> Dict[str, Number]:
-        new_data: Dict[str, Number] = {}
-        b: List[List[int]] = np.random.randint(0, M, (N, N)).tolist()
-        for algoheu in self._algoheus:
-            g: State = FillZoneGraphState(b)
-            search_tree = SearchTree(g, algoheu[1])
-            new_data[_get_key(algoheu)] = self._get_useful_data(search_tree, algoheu[0])
-        return new_data
-
-    def _get_useful_data(self, search_tree: SearchTree, a: Algorithm) -> Number:
+    def _get_useful_data(self, measurement: Measurement) -> Number:
         raise NotImplementedError()
 
-    def _add_data(self, data, new_data):
-        for key in new_data.keys():
-            data[key].append(new_data[key])
-
     def _post_process(self, data):
         algos = list(data.keys())
         return [
@@ -154,70 +197,56 @@ class OptimalTimeBarPlotSupplier(BarPlotSupplier):
     def __init__(self):
         super().__init__("optimal_times", "Time in s", OPTIMAL_PAIRS)
 
-    def _get_useful_data(self, search_tree: SearchTree, a: Algorithm) -> Number:
-        start_time = time.time()
-        search_tree.search(a)
-        end_time = time.time()
-        return end_time - start_time
+    def _get_useful_data(self, measurement: Measurement) -> Number:
+        return measurement.seconds
 
 
 class OptimalExpandedBarPlotSupplier(BarPlotSupplier):
     def __init__(self):
         super().__init__("optimal_expanded_nodes", "Expanded nodes", OPTIMAL_PAIRS)
 
-    def _get_useful_data(self, search_tree: SearchTree, a: Algorithm) -> Number:
-        res: Result = search_tree.search(a)
-        return res.expanded_nodes
+    def _get_useful_data(self, measurement: Measurement) -> Number:
+        return measurement.expanded_nodes
 
 
 class OptimalFrontierBarPlotSupplier(BarPlotSupplier):
     def __init__(self):
         super().__init__("optimal_frontier_nodes", "Frontier nodes", OPTIMAL_PAIRS)
 
-    def _get_useful_data(self, search_tree: SearchTree, a: Algorithm) -> Number:
-        res: Result = search_tree.search(a)
-        return res.frontier_nodes
+    def _get_useful_data(self, measurement: Measurement) -> Number:
+        return measurement.frontier_nodes
 
 
 class NotOptimalTimeBarPlotSupplier(BarPlotSupplier):
     def __init__(self):
         super().__init__("not_optimal_times", "Time in s", NOT_OPTIMAL_PAIRS)
 
-    def _get_useful_data(self, search_tree: SearchTree, a: Algorithm) -> Number:
-        start_time = time.time()
-        search_tree.search(a)
-        end_time = time.time()
-        return end_time - start_time
+    def _get_useful_data(self, measurement: Measurement) -> Number:
+        return measurement.seconds
 
 
 class NotOptimalExpandedBarPlotSupplier(BarPlotSupplier):
     def __init__(self):
         super().__init__("not_optimal_expanded_nodes", "Expanded nodes", NOT_OPTIMAL_PAIRS)
 
-    def _get_useful_data(self, search_tree: SearchTree, a: Algorithm) -> Number:
-        res: Result = search_tree.search(a)
-        return res.expanded_nodes
+    def _get_useful_data(self, measurement: Measurement) -> Number:
+        return measurement.expanded_nodes
 
 
 class NotOptimalFrontierBarPlotSupplier(BarPlotSupplier):
     def __init__(self):
         super().__init__("not_optimal_frontier_nodes", "Frontier nodes", NOT_OPTIMAL_PAIRS)
 
-    def _get_useful_data(self, search_tree: SearchTree, a: Algorithm) -> Number:
-        res: Result = search_tree.search(a)
-        return res.frontier_nodes
+    def _get_useful_data(self, measurement: Measurement) -> Number:
+        return measurement.frontier_nodes
 
 
 class MemoryBarPlotSupplier(BarPlotSupplier):
     def __init__(self):
-        super().__init__("memory", "Memory Usage", MEMORY_ANAL)
+        super().__init__("memory", "Peak memory in bytes", MEMORY_ANAL)
 
-    def _get_useful_data(self, search_tree: SearchTree, a: Algorithm) -> Number:
-        tracemalloc.start()
-        res: Result = search_tree.search(a)
-        value = tracemalloc.get_traced_memory()
-        tracemalloc.stop()
-        return value
+    def _get_useful_data(self, measurement: Measurement) -> Number:
+        return measurement.peak_memory
 
 
 # tiempos de optimos
@@ -241,5 +270,16 @@ if __name__ == "__main__":
         NotOptimalFrontierBarPlotSupplier(),
         MemoryBarPlotSupplier()
     ]
+    # Every pair is run once and its measurements shared by all the plots that include it
+    algoheus: Dict[str, Tuple[Algorithm, Heuristic]] = {}
+    for test in tests:
+        for algoheu in test.get_algoheus():
+            algoheus.setdefault(_get_key(algoheu), algoheu)
+    measurements = run_benchmark(list(algoheus.values()))
+    for key, values in measurements.items():
+        timed_out = sum(m.timed_out for m in values)
+        if timed_out > 0:
+            print(f"{key}: {timed_out} of {len(values)} searches timed out after {JOB_TIMEOUT}s")
+
     for test in tests:
-        test.plot()
+        test.plot(measurements)
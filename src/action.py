@@ -1,2 +1,7 @@
+from __future__ import annotations
+
+
 class Action:
-    pass
+    def inverse(self) -> Action:
+        """Action that undoes this one, only needed by bidirectional searches"""
+        raise NotImplementedError()
@@ -1,8 +1,12 @@
+import heapq
+import math
 from abc import ABC
-from queue import PriorityQueue, Queue
-from typing import List, Tuple, Set
+from collections import deque
+from typing import List, Set, Deque, Dict, Iterator, Optional, Tuple
 
 from .action import Action
+from .budget import SearchBudget
+from .frontier import HeapFrontier
 from .result import Result
 from .search_tree import SearchTree, STNode
 
@@ -20,29 +24,84 @@ def get_solution(node: STNode) -> List[Action]:
     return solution
 
 
+def closest_node(node: STNode, best: Optional[STNode]) -> STNode:
+    """Node with the lowest estimate, best on ties"""
+    return node if best is None or node.get_estimate() < best.get_estimate() else best
+
+
+def get_stopped_result(reason: str, partial: Optional[STNode], expanded: int, frontier: int, generated: int) \
+        -> Result:
+    return Result.stopped(reason, expanded, frontier, generated, None if partial is None else get_solution(partial))
+
+
+EXPANSION_DUPLICATE_DETECTION = "expansion"
+GENERATION_DUPLICATE_DETECTION = "generation"
+
+
 class Algorithm(ABC):
+    def __init__(self, duplicate_detection: str = EXPANSION_DUPLICATE_DETECTION):
+        """
+        With "expansion" duplicate detection a node is discarded when popped if its state was already expanded.
+        With "generation" a child is discarded as soon as it is generated if its state was already reached with
+        a lower or equal cost, before its heuristic is evaluated, and a state is reopened if a cheaper path to it
+        is found, so A* stays optimal.
+        """
+        if duplicate_detection not in [EXPANSION_DUPLICATE_DETECTION, GENERATION_DUPLICATE_DETECTION]:
+            raise ValueError("Unsupported duplicate detection policy")
+        self._duplicate_detection = duplicate_detection
+        self._budget = SearchBudget()
+
+    def set_budget(self, budget: SearchBudget):
+        """Limits of the following searches, when one is reached the search returns a Result with the name of
+        the limit as status and the path to the expanded node with the lowest estimate as partial solution"""
+        self._budget = budget
+
     def search(self, tree: SearchTree) -> Result:
+        self._budget.start()
+        # Only tracked with a budget, as it needs the heuristic of every expanded node
+        track_partial = self._budget.is_limited()
+        partial: Optional[STNode] = None
         expanded = 0
+        generated = 0
         frontier = self._create_frontier()
         self._add_to_frontier(frontier, tree.get_root())
+        on_generation = self._duplicate_detection == GENERATION_DUPLICATE_DETECTION
         visited: Set[STNode] = set()
+        best_costs: Dict[STNode, int] = {tree.get_root(): 0}
 
         while not self._frontier_is_empty(frontier):
             curr_node = self._get_from_frontier(frontier)
-            if curr_node in visited:
-                continue
-
-            visited.add(curr_node)
+            if on_generation:
+                # A cheaper path to the state was found after this node was pushed
+                if curr_node.get_cost() > best_costs[curr_node]:
+                    continue
+            else:
+                if curr_node in visited:
+                    continue
+                visited.add(curr_node)
 
             if curr_node.is_solution():
-                return Result(curr_node.get_cost(), expanded, self._frontier_length(frontier), get_solution(curr_node))
+                return Result(curr_node.get_cost(), expanded, self._frontier_length(frontier), get_solution(curr_node),
+                              generated)
+
+            if track_partial:
+                partial = closest_node(curr_node, partial)
+            reason = self._budget.exceeded(expanded, self._frontier_length(frontier))
+            if reason is not None:
+                return get_stopped_result(reason, partial, expanded, self._frontier_length(frontier), generated)
 
             # Expand node
             expanded += 1
             for child in curr_node.expand():
+                generated += 1
+                if on_generation:
+                    best_cost = best_costs.get(child)
+                    if best_cost is not None and best_cost <= child.get_cost():
+                        continue
+                    best_costs[child] = child.get_cost()
                 self._add_to_frontier(frontier, child)
 
-        return Result.empty(expanded)
+        return Result.empty(expanded, generated)
 
     def _create_frontier(self):
         raise NotImplementedError()
@@ -61,20 +120,20 @@ class Algorithm(ABC):
 
 
 class BfsAlgorithm(Algorithm):
-    def _create_frontier(self) -> Queue[STNode]:
-        return Queue()
+    def _create_frontier(self) -> Deque[STNode]:
+        return deque()
 
-    def _add_to_frontier(self, frontier: Queue[STNode], node: STNode):
-        frontier.put(node)
+    def _add_to_frontier(self, frontier: Deque[STNode], node: STNode):
+        frontier.append(node)
 
-    def _get_from_frontier(self, frontier: Queue[STNode]) -> STNode:
-        return frontier.get()
+    def _get_from_frontier(self, frontier: Deque[STNode]) -> STNode:
+        return frontier.popleft()
 
-    def _frontier_is_empty(self, frontier: Queue[STNode]) -> bool:
-        return frontier.empty()
+    def _frontier_is_empty(self, frontier: Deque[STNode]) -> bool:
+        return len(frontier) == 0
 
-    def _frontier_length(self, frontier: Queue[STNode]) -> int:
-        return frontier.qsize()
+    def _frontier_length(self, frontier: Deque[STNode]) -> int:
+        return len(frontier)
 
 
 class DfsAlgorithm(Algorithm):
@@ -94,37 +153,371 @@ class DfsAlgorithm(Algorithm):
         return len(frontier)
 
 
-class GreedyAlgorithm(Algorithm):
-    def _create_frontier(self) -> PriorityQueue[Tuple[int, STNode]]:
-        return PriorityQueue()
+class PriorityAlgorithm(Algorithm, ABC):
+    def _priority(self, node: STNode) -> int:
+        raise NotImplementedError()
+
+    def _create_frontier(self) -> HeapFrontier:
+        return HeapFrontier()
+
+    def _add_to_frontier(self, frontier: HeapFrontier, node: STNode):
+        frontier.push(self._priority(node), node)
+
+    def _get_from_frontier(self, frontier: HeapFrontier) -> STNode:
+        return frontier.pop()
+
+    def _frontier_is_empty(self, frontier: HeapFrontier) -> bool:
+        return len(frontier) == 0
+
+    def _frontier_length(self, frontier: HeapFrontier) -> int:
+        return len(frontier)
+
+
+class GreedyAlgorithm(PriorityAlgorithm):
+    def _priority(self, node: STNode) -> int:
+        return node.get_estimate()
+
 
-    def _add_to_frontier(self, frontier: PriorityQueue[Tuple[int, STNode]], node: STNode):
-        frontier.put((node.get_estimate(), node))
+class AStarAlgorithm(PriorityAlgorithm):
+    def _priority(self, node: STNode) -> int:
+        return node.get_estimate() + node.get_cost()
 
-    def _get_from_frontier(self, frontier: PriorityQueue[Tuple[int, STNode]]) -> STNode:
-        order, node = frontier.get()
-        return node
 
-    def _frontier_is_empty(self, frontier: PriorityQueue[Tuple[int, STNode]]) -> bool:
-        return frontier.empty()
+class WeightedAStarAlgorithm(PriorityAlgorithm):
+    """A* with f = g + weight * h, solutions cost at most weight times the optimal with an admissible heuristic"""
 
-    def _frontier_length(self, frontier: PriorityQueue[Tuple[int, STNode]]) -> int:
-        return frontier.qsize()
+    def __init__(self, weight: float = 2, duplicate_detection: str = EXPANSION_DUPLICATE_DETECTION):
+        super().__init__(duplicate_detection)
+        self._weight = weight
 
+    def _priority(self, node: STNode) -> float:
+        return node.get_cost() + self._weight * node.get_estimate()
 
-class AStarAlgorithm(Algorithm):
-    def _create_frontier(self) -> PriorityQueue[Tuple[int, STNode]]:
-        return PriorityQueue()
 
-    def _add_to_frontier(self, frontier: PriorityQueue[Tuple[int, STNode]], node: STNode):
-        frontier.put((node.get_estimate() + node.get_cost(), node))
+class AraStarAlgorithm(Algorithm):
+    """Anytime Repairing A*: weighted A* searches with a weight lowered after every solution.
 
-    def _get_from_frontier(self, frontier: PriorityQueue[Tuple[int, STNode]]) -> STNode:
-        order, node = frontier.get()
-        return node
+    Each search reuses the nodes reached by the previous ones, only the states whose cost improved after they
+    were expanded are expanded again. Every solution is at most the weight bound times the optimal with an
+    admissible heuristic, and the last one, found with weight 1, is optimal.
+    """
 
-    def _frontier_is_empty(self, frontier: PriorityQueue[Tuple[int, STNode]]) -> bool:
-        return frontier.empty()
+    def __init__(self, initial_weight: float = 3, weight_step: float = 0.5):
+        super().__init__()
+        if initial_weight < 1 or weight_step <= 0:
+            raise ValueError("The weight must be at least 1 and the step positive")
+        self._initial_weight = initial_weight
+        self._weight_step = weight_step
+
+    def search(self, tree: SearchTree) -> Result:
+        result = Result.empty(0)
+        for result in self.solutions(tree):
+            pass
+        if not result.is_empty() or tree.get_root().is_solution():
+            if self._stop_reason is not None:
+                # The best solution found, with the limit that kept it from being improved and the totals
+                result.status = self._stop_reason
+                result.expanded_nodes = self._expanded
+                result.generated_nodes = self._generated
+            return result
+        if self._stop_reason is not None:
+            return Result.stopped(self._stop_reason, self._expanded, 0, self._generated)
+        return Result.empty(self._expanded, self._generated)
+
+    def solutions(self, tree: SearchTree) -> Iterator[Result]:
+        """Yields every improved solution with its weight bound, stops when the budget runs out or when it is
+        optimal"""
+        self._budget.start()
+        self._stop_reason: Optional[str] = None
+        self._expanded = 0
+        self._generated = 0
+        root = tree.get_root()
+        if root.is_solution():
+            yield Result(0, 0, 0, [], suboptimality_bound=1)
+            return
+
+        weight = self._initial_weight
+        # Cheapest node found for each state, the ones waiting on the frontier and the ones whose cost
+        # improved after they were expanded in the current search
+        best_nodes: Dict[STNode, STNode] = {root: root}
+        open_nodes: Dict[STNode, STNode] = {root: root}
+        inconsistent: Dict[STNode, STNode] = {}
+        frontier = HeapFrontier()
+        frontier.push(root.get_estimate() * weight, root)
+        incumbent: Optional[STNode] = None
+
+        while True:
+            closed: Set[STNode] = set()
+            improved = False
+            while len(frontier) > 0 and (incumbent is None or frontier.peek_priority() < incumbent.get_cost()):
+                self._stop_reason = self._budget.exceeded(self._expanded, len(frontier))
+                if self._stop_reason is not None:
+                    return
+                curr_node = frontier.pop()
+                # Stale entry of a node that was improved or already expanded
+                if open_nodes.get(curr_node) is not curr_node:
+                    continue
+                del open_nodes[curr_node]
+                closed.add(curr_node)
+
+                if curr_node.is_solution():
+                    if incumbent is None or curr_node.get_cost() < incumbent.get_cost():
+                        incumbent = curr_node
+                        improved = True
+                    continue
+
+                # Expand node
+                self._expanded += 1
+                for child in curr_node.expand():
+                    self._generated += 1
+                    best_node = best_nodes.get(child)
+                    if best_node is not None and best_node.get_cost() <= child.get_cost():
+                        continue
+                    best_nodes[child] = child
+                    if child in closed:
+                        inconsistent[child] = child
+                    else:
+                        open_nodes[child] = child
+                        frontier.push(child.get_cost() + weight * child.get_estimate(), child)
+
+            if incumbent is None:
+                return
+            pending = list(open_nodes.values()) + list(inconsistent.values())
+            lower_bound = min((n.get_cost() + n.get_estimate() for n in pending), default=incumbent.get_cost())
+            bound = min(weight, incumbent.get_cost() / lower_bound) if lower_bound > 0 else weight
+            if improved or bound <= 1:
+                yield Result(incumbent.get_cost(), self._expanded, len(pending), get_solution(incumbent),
+                             self._generated, suboptimality_bound=max(bound, 1))
+            if bound <= 1:
+                return
+
+            weight = max(1, weight - self._weight_step)
+            open_nodes.update(inconsistent)
+            inconsistent.clear()
+            frontier = HeapFrontier()
+            for n in open_nodes.values():
+                frontier.push(n.get_cost() + weight * n.get_estimate(), n)
+
+
+class BeamSearchAlgorithm(Algorithm):
+    """Breadth first search that only keeps the width nodes with the lowest estimate of each depth,
+    memory is O(width * depth) but it may miss every solution"""
+
+    def __init__(self, width: int = 100):
+        super().__init__()
+        self._width = width
 
-    def _frontier_length(self, frontier: PriorityQueue[Tuple[int, STNode]]) -> int:
-        return frontier.qsize()
+    def search(self, tree: SearchTree) -> Result:
+        self._budget.start()
+        expanded = 0
+        generated = 0
+        root = tree.get_root()
+        if root.is_solution():
+            return Result(0, expanded, 0, [], generated)
+
+        partial: Optional[STNode] = None
+        layer: List[STNode] = [root]
+        visited: Set[STNode] = {root}
+        while layer:
+            children: List[STNode] = []
+            for curr_node in layer:
+                # Every node of the layer already has its estimate
+                partial = closest_node(curr_node, partial)
+                reason = self._budget.exceeded(expanded, len(layer) + len(children))
+                if reason is not None:
+                    return get_stopped_result(reason, partial, expanded, len(layer) + len(children), generated)
+                expanded += 1
+                for child in curr_node.generate():
+                    generated += 1
+                    if child in visited:
+                        continue
+                    if child.is_solution():
+                        return Result(child.get_cost(), expanded, len(children), get_solution(child), generated)
+                    visited.add(child)
+                    children.append(child)
+
+            layer = heapq.nsmallest(self._width, children, key=lambda n: n.get_estimate())
+            # Discarded children may be reached again from a later layer
+            visited.difference_update(set(children).difference(layer))
+
+        return Result.empty(expanded, generated)
+
+
+class IterativeDeepeningAlgorithm(Algorithm, ABC):
+    """Depth first searches with an increasing bound, only the current path is kept in memory"""
+
+    def __init__(self, check_cycles: bool = True):
+        super().__init__()
+        # Discard children whose state is already on the current path
+        self._check_cycles = check_cycles
+
+    def _bound(self, node: STNode) -> int:
+        raise NotImplementedError()
+
+    def search(self, tree: SearchTree) -> Result:
+        self._budget.start()
+        track_partial = self._budget.is_limited()
+        partial: Optional[STNode] = None
+        expanded = 0
+        generated = 0
+        root = tree.get_root()
+        if root.is_solution():
+            return Result(0, expanded, 0, [], generated)
+
+        bound = self._bound(root)
+        while True:
+            next_bound = math.inf
+            path: List[STNode] = [root]
+            on_path: Set[STNode] = {root}
+            children: List[Iterator[STNode]] = [root.generate()]
+            expanded += 1
+
+            while children:
+                child = next(children[-1], None)
+                if child is None:
+                    children.pop()
+                    on_path.discard(path.pop())
+                    continue
+
+                generated += 1
+                if self._check_cycles and child in on_path:
+                    continue
+
+                child_bound = self._bound(child)
+                if child_bound > bound:
+                    next_bound = min(next_bound, child_bound)
+                    continue
+
+                if child.is_solution():
+                    return Result(child.get_cost(), expanded, len(path), get_solution(child), generated)
+
+                if track_partial:
+                    partial = closest_node(child, partial)
+                reason = self._budget.exceeded(expanded, len(path))
+                if reason is not None:
+                    return get_stopped_result(reason, partial, expanded, len(path), generated)
+
+                # Expand node
+                expanded += 1
+                path.append(child)
+                if self._check_cycles:
+                    on_path.add(child)
+                children.append(child.generate())
+
+            if next_bound == math.inf:
+                return Result.empty(expanded, generated)
+            bound = next_bound
+
+
+class IddfsAlgorithm(IterativeDeepeningAlgorithm):
+    def _bound(self, node: STNode) -> int:
+        return node.get_cost()
+
+
+class IdaStarAlgorithm(IterativeDeepeningAlgorithm):
+    def _bound(self, node: STNode) -> int:
+        return node.get_estimate() + node.get_cost()
+
+
+def get_bidirectional_solution(forward_node: STNode, backward_node: STNode) -> List[Action]:
+    """Forward path to the meeting state followed by the backward path undone from the meeting state to the goal"""
+    backward_solution = get_solution(backward_node)
+    return get_solution(forward_node) + [a.inverse() for a in reversed(backward_solution)]
+
+
+class BidirectionalAlgorithm(Algorithm, ABC):
+    """Searches forward from the initial state and backward from the goal until both searches meet.
+    Requires states that implement State.reverse and actions that implement Action.inverse"""
+
+    def search(self, tree: SearchTree) -> Result:
+        self._budget.start()
+        forward_root = tree.get_root()
+        if forward_root.is_solution():
+            return Result(0, 0, 0, [])
+        backward_root = SearchTree(forward_root.get_state().reverse(), tree.get_heuristic()).get_root()
+        return self._bidirectional_search(forward_root, backward_root)
+
+    def _bidirectional_search(self, forward_root: STNode, backward_root: STNode) -> Result:
+        raise NotImplementedError()
+
+
+class BidirectionalBfsAlgorithm(BidirectionalAlgorithm):
+    def _bidirectional_search(self, forward_root: STNode, backward_root: STNode) -> Result:
+        expanded = 0
+        generated = 0
+        frontiers: List[Deque[STNode]] = [deque([forward_root]), deque([backward_root])]
+        reached: List[Dict[STNode, STNode]] = [{forward_root: forward_root}, {backward_root: backward_root}]
+        best_cost = math.inf
+        meeting: Optional[Tuple[STNode, STNode]] = None
+
+        while frontiers[0] and frontiers[1]:
+            # Expand a whole layer of the smallest frontier, the best meeting found in it is optimal
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            frontier = frontiers[side]
+            for _ in range(len(frontier)):
+                reason = self._budget.exceeded(expanded, len(frontiers[0]) + len(frontiers[1]))
+                if reason is not None:
+                    return Result.stopped(reason, expanded, len(frontiers[0]) + len(frontiers[1]), generated)
+                curr_node = frontier.popleft()
+                expanded += 1
+                for child in curr_node.generate():
+                    generated += 1
+                    if child in reached[side]:
+                        continue
+                    reached[side][child] = child
+                    other = reached[1 - side].get(child)
+                    if other is not None and child.get_cost() + other.get_cost() < best_cost:
+                        best_cost = child.get_cost() + other.get_cost()
+                        meeting = (child, other) if side == 0 else (other, child)
+                    frontier.append(child)
+
+            if meeting is not None:
+                return Result(best_cost, expanded, len(frontiers[0]) + len(frontiers[1]),
+                              get_bidirectional_solution(*meeting), generated)
+
+        return Result.empty(expanded, generated)
+
+
+class BidirectionalAStarAlgorithm(BidirectionalAlgorithm):
+    """Front to end bidirectional A*: each direction estimates the distance to the root of the other one"""
+
+    def _bidirectional_search(self, forward_root: STNode, backward_root: STNode) -> Result:
+        expanded = 0
+        generated = 0
+        frontiers: List[HeapFrontier] = [HeapFrontier(), HeapFrontier()]
+        best_nodes: List[Dict[STNode, STNode]] = [{forward_root: forward_root}, {backward_root: backward_root}]
+        for side, root in enumerate([forward_root, backward_root]):
+            frontiers[side].push(root.get_estimate(), root)
+        best_cost = math.inf
+        meeting: Optional[Tuple[STNode, STNode]] = None
+
+        while frontiers[0] and frontiers[1]:
+            # Every path not found yet costs at least the lowest f on both frontiers
+            if best_cost <= max(frontiers[0].peek_priority(), frontiers[1].peek_priority()):
+                break
+
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            curr_node = frontiers[side].pop()
+            if curr_node.get_cost() > best_nodes[side][curr_node].get_cost():
+                continue
+
+            reason = self._budget.exceeded(expanded, len(frontiers[0]) + len(frontiers[1]))
+            if reason is not None:
+                return Result.stopped(reason, expanded, len(frontiers[0]) + len(frontiers[1]), generated)
+            expanded += 1
+            for child in curr_node.generate():
+                generated += 1
+                best_node = best_nodes[side].get(child)
+                if best_node is not None and best_node.get_cost() <= child.get_cost():
+                    continue
+                best_nodes[side][child] = child
+                frontiers[side].push(child.get_cost() + child.get_estimate(), child)
+                other = best_nodes[1 - side].get(child)
+                if other is not None and child.get_cost() + other.get_cost() < best_cost:
+                    best_cost = child.get_cost() + other.get_cost()
+                    meeting = (child, other) if side == 0 else (other, child)
+
+        if meeting is None:
+            return Result.empty(expanded, generated)
+        return Result(best_cost, expanded, len(frontiers[0]) + len(frontiers[1]), get_bidirectional_solution(*meeting),
+                      generated)
@@ -3,7 +3,7 @@ from __future__ import annotations
 from copy import deepcopy
 from typing import List, Tuple
 from queue import Queue
-from main import generate_fill_zone_board
+from src.board_parser import parse_matrix
 from src.fill_zone.action import FillZoneAction
 
 # TODO: move these methods to avoid code repetition
@@ -79,7 +79,6 @@ class Board:
 
     @staticmethod
     def from_string(s: str) -> Board:
-        m = generate_fill_zone_board(s)
-        return Board(m)
+        return Board(parse_matrix(s))
 
 
@@ -0,0 +1,35 @@
+import ast
+import random
+from typing import List, Tuple
+
+
+def parse_matrix(board) -> List[List]:
+    """Matrix of a board written as rows separated by ';' of values separated by ',' or spaces, for example
+    "1,2;3,None". Values are Python literals. A board that is already a list of rows is copied"""
+    if not isinstance(board, str):
+        return [list(row) for row in board]
+
+    matrix = []
+    for row in board.split(";"):
+        values = [ast.literal_eval(value) for column in row.split(",") for value in column.split()]
+        if matrix and len(values) != len(matrix[0]):
+            raise ValueError("Rows not the same size")
+        matrix.append(values)
+    return matrix
+
+
+def generate_fill_zone_board(board_settings) -> List[List[int]]:
+    match board_settings["type"]:
+        case "static":
+            return parse_matrix(board_settings["board"])
+        case "random":
+            n = board_settings["board_size"]
+            m = board_settings["color_count"]
+            return [[random.randrange(m) for _ in range(n)] for _ in range(n)]
+        case _:
+            raise ValueError("Unsupported board generation method")
+
+
+# TODO: support more board creation settings
+def generate_eight_puzzle_board(board_settings) -> Tuple[List[List[int]], List[List[int]]]:
+    return parse_matrix(board_settings["board"]), parse_matrix(board_settings["goal"])
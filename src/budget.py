@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+MAX_EXPANDED = "max_expanded"
+MAX_FRONTIER = "max_frontier"
+MAX_SECONDS = "max_seconds"
+MAX_MEMORY_MB = "max_memory_mb"
+
+
+def get_memory_mb() -> float:
+    """Resident memory of the process now, or its peak so far where /proc is not available"""
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class SearchBudget:
+    """Limits on the resources a search may use, None meaning unlimited.
+
+    The memory limit is on what the process grows from the start of the search, so that searches run one after
+    the other in the same process are not stopped by what an earlier one used. The clock and the memory are only
+    checked once every CHECK_INTERVAL expanded nodes, so that the searches do not pay for a system call on every
+    expansion.
+    """
+
+    CHECK_INTERVAL = 256
+
+    def __init__(self, max_expanded: Optional[int] = None, max_frontier: Optional[int] = None,
+                 max_seconds: Optional[float] = None, max_memory_mb: Optional[float] = None):
+        if max_memory_mb is not None and resource is None:
+            raise ValueError("The memory limit is not supported on this platform")
+        self._max_expanded = max_expanded
+        self._max_frontier = max_frontier
+        self._max_seconds = max_seconds
+        self._max_memory_mb = max_memory_mb
+        self._start_time = time.perf_counter()
+        self._start_memory_mb = 0.0
+        self._checked_at: Optional[int] = None
+
+    def is_limited(self) -> bool:
+        return any(limit is not None for limit in
+                   [self._max_expanded, self._max_frontier, self._max_seconds, self._max_memory_mb])
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        if self._max_memory_mb is not None:
+            self._start_memory_mb = get_memory_mb()
+        self._checked_at: Optional[int] = None
+
+    def get_elapsed(self) -> float:
+        return time.perf_counter() - self._start_time
+
+    def exceeded(self, expanded: int, frontier: int = 0) -> Optional[str]:
+        """Name of the first limit reached, None if the search can go on"""
+        if self._max_expanded is not None and expanded >= self._max_expanded:
+            return MAX_EXPANDED
+        if self._max_frontier is not None and frontier >= self._max_frontier:
+            return MAX_FRONTIER
+
+        # The first call is always checked, so a search can not start when the budget is already spent
+        if self._checked_at is not None and expanded - self._checked_at < self.CHECK_INTERVAL:
+            return None
+        self._checked_at = expanded
+        if self._max_seconds is not None and self.get_elapsed() >= self._max_seconds:
+            return MAX_SECONDS
+        if self._max_memory_mb is not None and get_memory_mb() - self._start_memory_mb >= self._max_memory_mb:
+            return MAX_MEMORY_MB
+        return None
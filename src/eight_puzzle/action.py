@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from enum import Enum
 
 from src.action import Action
@@ -9,6 +11,9 @@ class EightPuzzleAction(Action, Enum):
     LEFT = (0, -1)
     RIGHT = (0, 1)
 
+    def inverse(self) -> EightPuzzleAction:
+        return EightPuzzleAction((-self.value[0], -self.value[1]))
+
     def __repr__(self):
         match self:
             case EightPuzzleAction.UP:
@@ -1,5 +1,17 @@
+from typing import List, Optional, Dict, Tuple
+
+from src.eight_puzzle.action import EightPuzzleAction
+from src.eight_puzzle.pattern_database import PatternDatabase, default_patterns, get_pattern_databases
 from src.heuristics import Heuristic
-from src.eight_puzzle.state import EightPuzzleMatrixState
+from src.eight_puzzle.state import EightPuzzleMatrixState, EightPuzzlePackedState
+
+
+def _moved_tile(state: EightPuzzleMatrixState | EightPuzzlePackedState, action: EightPuzzleAction) \
+        -> Tuple[int, Tuple[int, int], Tuple[int, int]]:
+    """Tile moved by the action that reached state, with the positions it moved from and to"""
+    origin = state.get_blank_position()
+    destination = (origin[0] - action.value[0], origin[1] - action.value[1])
+    return state.get_tile(destination[0], destination[1]), origin, destination
 
 
 class OutOfPlaceHeuristic(Heuristic):
@@ -14,6 +26,13 @@ class OutOfPlaceHeuristic(Heuristic):
                     estimate += 1
         return estimate
 
+    def calculate_incremental(self, state: EightPuzzleMatrixState | EightPuzzlePackedState, parent_estimate: int,
+                              action: EightPuzzleAction) -> int:
+        # Only the moved tile can change its place
+        tile, origin, destination = _moved_tile(state, action)
+        g = state.get_goal()
+        return parent_estimate - (tile != g[origin[0]][origin[1]]) + (tile != g[destination[0]][destination[1]])
+
 
 class ManhattanHeuristic(Heuristic):
     @staticmethod
@@ -25,3 +44,57 @@ class ManhattanHeuristic(Heuristic):
                 pos = state.position(g[i][j])
                 estimate += abs(pos[0] - i) + abs(pos[1] - j)
         return estimate
+
+    def __init__(self):
+        self._goal = None
+        self._goal_positions: Dict[Optional[int], Tuple[int, int]] = {}
+
+    def calculate_incremental(self, state: EightPuzzleMatrixState | EightPuzzlePackedState, parent_estimate: int,
+                              action: EightPuzzleAction) -> int:
+        # Only the moved tile and the blank change their distance, by one each
+        goal = state.get_goal()
+        if goal is not self._goal:
+            self._goal = goal
+            self._goal_positions = {goal[i][j]: (i, j) for i in range(len(goal)) for j in range(len(goal[0]))}
+        tile, origin, destination = _moved_tile(state, action)
+        tile_goal = self._goal_positions[tile]
+        blank_goal = self._goal_positions[None]
+        return parent_estimate \
+            - abs(origin[0] - tile_goal[0]) - abs(origin[1] - tile_goal[1]) \
+            + abs(destination[0] - tile_goal[0]) + abs(destination[1] - tile_goal[1]) \
+            - abs(destination[0] - blank_goal[0]) - abs(destination[1] - blank_goal[1]) \
+            + abs(origin[0] - blank_goal[0]) + abs(origin[1] - blank_goal[1])
+
+
+DEFAULT_PATTERN_DATABASE_DIR = ".pattern_databases"
+
+
+class PatternDatabaseHeuristic(Heuristic):
+    """Sum of disjoint pattern databases of the goal of the state, see PatternDatabase.
+
+    Databases are built on first use for each goal and saved to cache_dir, so later runs only load them.
+    By default the tiles are split in goal order in groups of 4, or of 5 on boards bigger than 3x3.
+    """
+
+    def __init__(self, patterns: Optional[List[List[int]]] = None,
+                 cache_dir: Optional[str] = DEFAULT_PATTERN_DATABASE_DIR):
+        self._patterns = patterns
+        self._cache_dir = cache_dir
+        self._databases: Dict[Tuple[Optional[int], ...], List[PatternDatabase]] = {}
+
+    def calculate(self, state: EightPuzzleMatrixState | EightPuzzlePackedState) -> int:
+        cells = [t for row in state.get_matrix() for t in row]
+        databases = self._get_databases(state.get_goal())
+        positions = [0] * len(cells)
+        for cell, tile in enumerate(cells):
+            if tile is not None:
+                positions[tile] = cell
+        return sum(database.lookup(positions) for database in databases)
+
+    def _get_databases(self, goal: List[List[Optional[int]]]) -> List[PatternDatabase]:
+        flat_goal = [t for row in goal for t in row]
+        key = tuple(flat_goal)
+        if key not in self._databases:
+            patterns = self._patterns if self._patterns is not None else default_patterns(flat_goal)
+            self._databases[key] = get_pattern_databases(len(goal), flat_goal, patterns, self._cache_dir)
+        return self._databases[key]
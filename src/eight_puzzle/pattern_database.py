@@ -0,0 +1,138 @@
+import logging
+import os
+from collections import deque
+from typing import List, Optional, Tuple, Sequence, Deque
+
+UNKNOWN = 0xFF
+
+
+def partial_permutations(cells: int, k: int) -> int:
+    """Amount of ways of placing k distinguishable tiles in cells cells"""
+    count = 1
+    for i in range(k):
+        count *= cells - i
+    return count
+
+
+def rank(positions: Sequence[int], cells: int) -> int:
+    """Index of an arrangement of distinct positions among every arrangement of as many positions, from 0 to
+    partial_permutations(cells, len(positions)) - 1"""
+    r = 0
+    used = 0
+    for i, p in enumerate(positions):
+        r = r * (cells - i) + p - (used & ((1 << p) - 1)).bit_count()
+        used |= 1 << p
+    return r
+
+
+class PatternDatabase:
+    """Exact amount of moves of the pattern tiles needed to place them in their goal cells, for every placement of
+    those tiles, ignoring the rest of the tiles.
+
+    Only moves of pattern tiles are counted, so the values of disjoint patterns can be added together and still
+    never overestimate. The table is built by a breadth first search backwards from the goal and stored as one
+    byte per placement.
+    """
+
+    def __init__(self, size: int, goal: List[Optional[int]], pattern: Sequence[int], table: bytearray):
+        self._size = size
+        self._cells = size * size
+        self._goal = goal
+        self._pattern = tuple(pattern)
+        self._table = table
+
+    def get_pattern(self) -> Tuple[int, ...]:
+        return self._pattern
+
+    def lookup(self, positions: Sequence[int]) -> int:
+        """Value for a board, positions being the cell of each tile indexed by tile number"""
+        return self._table[rank([positions[t] for t in self._pattern], self._cells)]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self._table)
+
+    @classmethod
+    def load(cls, path: str, size: int, goal: List[Optional[int]], pattern: Sequence[int]) \
+            -> Optional["PatternDatabase"]:
+        with open(path, "rb") as f:
+            table = bytearray(f.read())
+        if len(table) != partial_permutations(size * size, len(pattern)):
+            return None
+        return cls(size, goal, pattern, table)
+
+    @classmethod
+    def build(cls, size: int, goal: List[Optional[int]], pattern: Sequence[int]) -> "PatternDatabase":
+        cells = size * size
+        k = len(pattern)
+        neighbors = [[n for n in _neighbor_cells(c, size)] for c in range(cells)]
+        start = tuple(goal.index(t) for t in pattern) + (goal.index(None),)
+
+        # Pattern tiles and blank positions, the blank is needed to know which moves are possible
+        costs = bytearray([UNKNOWN]) * partial_permutations(cells, k + 1)
+        table = bytearray([UNKNOWN]) * partial_permutations(cells, k)
+        costs[rank(start, cells)] = 0
+        # 0-1 breadth first search: moving the blank over a tile outside the pattern is free
+        queue: Deque[Tuple[int, ...]] = deque([start])
+        while queue:
+            positions = queue.popleft()
+            cost = costs[rank(positions, cells)]
+            tiles_rank = rank(positions[:k], cells)
+            if cost < table[tiles_rank]:
+                table[tiles_rank] = cost
+
+            blank = positions[k]
+            for target in neighbors[blank]:
+                if target in positions[:k]:
+                    tile = positions.index(target)
+                    new_positions = positions[:tile] + (blank,) + positions[tile + 1:k] + (target,)
+                    new_cost = cost + 1
+                else:
+                    new_positions = positions[:k] + (target,)
+                    new_cost = cost
+                new_rank = rank(new_positions, cells)
+                if costs[new_rank] == UNKNOWN or new_cost < costs[new_rank]:
+                    costs[new_rank] = new_cost
+                    if new_cost == cost:
+                        queue.appendleft(new_positions)
+                    else:
+                        queue.append(new_positions)
+
+        return cls(size, goal, pattern, table)
+
+
+def _neighbor_cells(cell: int, size: int) -> List[int]:
+    i, j = divmod(cell, size)
+    return [ni * size + nj for ni, nj in [(i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)]
+            if 0 <= ni < size and 0 <= nj < size]
+
+
+def default_patterns(goal: List[Optional[int]]) -> List[List[int]]:
+    """Tiles split in goal order in groups of 4 for the 8-puzzle and 5 for bigger boards"""
+    tiles = [t for t in goal if t is not None]
+    group = 4 if len(goal) <= 9 else 5
+    return [tiles[i:i + group] for i in range(0, len(tiles), group)]
+
+
+def get_pattern_databases(size: int, goal: List[Optional[int]], patterns: List[List[int]],
+                          cache_dir: Optional[str]) -> List[PatternDatabase]:
+    """Databases of the patterns for the goal, loaded from cache_dir if they were built by a previous run"""
+    databases = []
+    goal_key = "-".join(str(t or 0) for t in goal)
+    for pattern in patterns:
+        path = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, f"pdb_{size}x{size}_{goal_key}_{'-'.join(map(str, pattern))}.bin")
+            if os.path.exists(path):
+                database = PatternDatabase.load(path, size, goal, pattern)
+                if database is not None:
+                    databases.append(database)
+                    continue
+
+        logging.info(f"Building pattern database for tiles {pattern}")
+        database = PatternDatabase.build(size, goal, pattern)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            database.save(path)
+        databases.append(database)
+    return databases
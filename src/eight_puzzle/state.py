@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from copy import deepcopy
-from typing import Optional, List, Set, Tuple
+from typing import Optional, List, Set, Tuple, Dict
 
 from src.eight_puzzle.action import EightPuzzleAction
 from src.state import State
@@ -54,14 +54,26 @@ class EightPuzzleMatrixState(State):
         return actions
 
     def apply(self, action: EightPuzzleAction) -> EightPuzzleMatrixState:
-        new_state: EightPuzzleMatrixState = deepcopy(self)
         none_pos = self._find_none()
         if none_pos is None:
             raise ValueError()
         other_pos = (none_pos[0] + action.value[0], none_pos[1] + action.value[1])
-        new_state._state[none_pos[0]][none_pos[1]] = self._state[other_pos[0]][other_pos[1]]
-        new_state._state[other_pos[0]][other_pos[1]] = None
-        return new_state
+        # Only the rows touched by the move are copied, the rest and the goal are shared with the parent
+        matrix = list(self._state)
+        for i in {none_pos[0], other_pos[0]}:
+            matrix[i] = list(matrix[i])
+        matrix[none_pos[0]][none_pos[1]] = self._state[other_pos[0]][other_pos[1]]
+        matrix[other_pos[0]][other_pos[1]] = None
+        return EightPuzzleMatrixState(matrix, self._goal)
+
+    def get_tile(self, i: int, j: int) -> Optional[int]:
+        return self._state[i][j]
+
+    def get_blank_position(self) -> Optional[Tuple[int, int]]:
+        return self._find_none()
+
+    def reverse(self) -> EightPuzzleMatrixState:
+        return EightPuzzleMatrixState(self._goal, self._state)
 
     def _find_none(self) -> Optional[Tuple[int, int]]:
         for i in range(3):
@@ -84,3 +96,124 @@ class EightPuzzleMatrixState(State):
                 if self._state[i][j] == number:
                     return i, j
         return None
+
+
+class _PackedPuzzle:
+    """Data shared by every packed state of a search: the goal and the move tables of the board size"""
+
+    def __init__(self, size: int, goal: List[List[Optional[int]]]):
+        self.size = size
+        self.goal_matrix = goal
+        self.goal, _ = pack(goal)
+        self.actions: List[Set[EightPuzzleAction]] = []
+        self.targets: List[Dict[EightPuzzleAction, int]] = []
+        for blank in range(size * size):
+            i, j = divmod(blank, size)
+            targets = {}
+            for a in EightPuzzleAction:
+                ni, nj = i + a.value[0], j + a.value[1]
+                if 0 <= ni < size and 0 <= nj < size:
+                    targets[a] = ni * size + nj
+            self.targets.append(targets)
+            self.actions.append(set(targets.keys()))
+
+
+class EightPuzzlePackedState(State):
+    """Puzzle state packed in a single int, 4 bits per cell in row major order with 0 as the blank.
+
+    Successors come from move tables precomputed for each blank position, so actions,
+    apply, hashing and the solution check are constant time integer operations.
+    Boards up to 4x4 fit in the 4 bits per cell.
+    """
+    __slots__ = ("_puzzle", "_board", "_blank")
+
+    def __init__(self, matrix: List[List[Optional[int]]], goal: List[List[Optional[int]]]):
+        size = len(matrix)
+        if size > 4 or any(len(row) != size for row in matrix) or len(goal) != size:
+            raise ValueError()
+        self._puzzle = _PackedPuzzle(size, goal)
+        self._board, self._blank = pack(matrix)
+
+    def _child(self, board: int, blank: int) -> EightPuzzlePackedState:
+        child = EightPuzzlePackedState.__new__(EightPuzzlePackedState)
+        child._puzzle = self._puzzle
+        child._board = board
+        child._blank = blank
+        return child
+
+    def is_solution(self) -> bool:
+        return self._board == self._puzzle.goal
+
+    def is_dead(self) -> bool:
+        return False
+
+    def get_possible_actions(self) -> Set[EightPuzzleAction]:
+        return self._puzzle.actions[self._blank]
+
+    def apply(self, action: EightPuzzleAction) -> EightPuzzlePackedState:
+        target = self._puzzle.targets[self._blank][action]
+        tile = (self._board >> (4 * target)) & 0xF
+        board = (self._board & ~(0xF << (4 * target))) | (tile << (4 * self._blank))
+        return self._child(board, target)
+
+    def reverse(self) -> EightPuzzlePackedState:
+        return EightPuzzlePackedState(self._puzzle.goal_matrix, self.get_matrix())
+
+    def get_goal(self) -> List[List[Optional[int]]]:
+        return self._puzzle.goal_matrix
+
+    def get_matrix(self) -> List[List[Optional[int]]]:
+        return unpack(self._board, self._puzzle.size)
+
+    def get_board(self) -> int:
+        return self._board
+
+    def get_blank(self) -> int:
+        """Index of the blank cell in row major order"""
+        return self._blank
+
+    def get_tile(self, i: int, j: int) -> Optional[int]:
+        return (self._board >> (4 * (i * self._puzzle.size + j))) & 0xF or None
+
+    def get_blank_position(self) -> Tuple[int, int]:
+        return divmod(self._blank, self._puzzle.size)
+
+    def position(self, number: Optional[int]) -> Optional[Tuple[int, int]]:
+        value = 0 if number is None else number
+        for cell in range(self._puzzle.size ** 2):
+            if (self._board >> (4 * cell)) & 0xF == value:
+                return divmod(cell, self._puzzle.size)
+        return None
+
+    def get_record(self) -> int:
+        return self._board
+
+    def get_record_bits(self) -> int:
+        return 4 * self._puzzle.size ** 2
+
+    def from_record(self, record: int) -> EightPuzzlePackedState:
+        blank = next(cell for cell in range(self._puzzle.size ** 2) if (record >> (4 * cell)) & 0xF == 0)
+        return self._child(record, blank)
+
+    def __eq__(self, other):
+        return isinstance(other, EightPuzzlePackedState) and self._board == other._board
+
+    def __hash__(self):
+        return hash(self._board)
+
+
+def pack(matrix: List[List[Optional[int]]]) -> Tuple[int, int]:
+    """Board packed 4 bits per cell, and the index of the blank"""
+    board = 0
+    blank = -1
+    for cell, value in enumerate(v for row in matrix for v in row):
+        if value is None:
+            blank = cell
+        else:
+            board |= value << (4 * cell)
+    return board, blank
+
+
+def unpack(board: int, size: int) -> List[List[Optional[int]]]:
+    cells = [(board >> (4 * cell)) & 0xF for cell in range(size * size)]
+    return [[cells[i * size + j] or None for j in range(size)] for i in range(size)]
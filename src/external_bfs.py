@@ -0,0 +1,222 @@
+import heapq
+import os
+import shutil
+import tempfile
+from typing import List, Optional, Iterator, Tuple
+
+import numpy as np
+
+from .action import Action
+from .algorithms import BfsAlgorithm
+from .result import Result
+from .search_tree import SearchTree
+from .state import State
+
+PARENT_DTYPE = np.int64
+
+
+class _Layer:
+    """Records of the states at one depth sorted in increasing order, and the index of the parent of each one
+    in the previous layer, both in memory mapped files"""
+
+    def __init__(self, directory: str, depth: int, width: int, size: int):
+        self.size = size
+        self.width = width
+        self._records_path = os.path.join(directory, f"layer_{depth}.records")
+        self._parents_path = os.path.join(directory, f"layer_{depth}.parents")
+
+    def create(self) -> Tuple[np.memmap, np.memmap]:
+        return (np.memmap(self._records_path, dtype=f"S{self.width}", mode="w+", shape=(max(self.size, 1),)),
+                np.memmap(self._parents_path, dtype=PARENT_DTYPE, mode="w+", shape=(max(self.size, 1),)))
+
+    def records(self) -> np.memmap:
+        return np.memmap(self._records_path, dtype=f"S{self.width}", mode="r", shape=(max(self.size, 1),))
+
+    def parents(self) -> np.memmap:
+        return np.memmap(self._parents_path, dtype=PARENT_DTYPE, mode="r", shape=(max(self.size, 1),))
+
+    def truncate(self, size: int):
+        """Drops the records past size, files are never left empty so that they can still be mapped"""
+        self.size = size
+        os.truncate(self._records_path, max(size, 1) * self.width)
+        os.truncate(self._parents_path, max(size, 1) * np.dtype(PARENT_DTYPE).itemsize)
+
+    def contains(self, records: np.ndarray) -> np.ndarray:
+        """Which of the sorted records are in this layer"""
+        if self.size == 0:
+            return np.zeros(len(records), dtype=bool)
+        layer = self.records()[:self.size]
+        positions = np.searchsorted(layer, records)
+        found = positions < self.size
+        found[found] = layer[positions[found]] == records[found]
+        return found
+
+
+class ExternalBfsAlgorithm(BfsAlgorithm):
+    """Breadth first search with its layers on disk, for state spaces whose frontier does not fit in memory.
+
+    Every layer is stored as fixed width records of its states, from State.get_record, in memory mapped files
+    of scratch_dir. The successors of a layer are sorted in runs of chunk_size records that are merged to drop
+    repeated states and the ones already in a previous layer, and each state keeps the index of its parent in
+    the previous layer so that the solution is rebuilt from the files at the end. Only one run and the buffers of
+    the merge are kept in memory.
+    """
+
+    def __init__(self, scratch_dir: Optional[str] = None, chunk_size: int = 1 << 18):
+        super().__init__()
+        self._scratch_dir = scratch_dir
+        self._chunk_size = chunk_size
+
+    def search(self, tree: SearchTree) -> Result:
+        self._budget.start()
+        root = tree.get_root().get_state()
+        if root.is_solution():
+            return Result(0, 0, 0, [])
+
+        if self._scratch_dir is not None:
+            os.makedirs(self._scratch_dir, exist_ok=True)
+        directory = tempfile.mkdtemp(prefix="external_bfs_", dir=self._scratch_dir)
+        try:
+            return self._search(root, directory)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _search(self, root: State, directory: str) -> Result:
+        width = (root.get_record_bits() + 7) // 8
+        expanded = 0
+        generated = 0
+
+        layer = _Layer(directory, 0, width, 1)
+        records, parents = layer.create()
+        records[0] = _encode(root.get_record(), width)
+        parents[0] = -1
+        records.flush()
+        parents.flush()
+        del records, parents
+        layers: List[_Layer] = [layer]
+
+        while layer.size > 0:
+            depth = len(layers)
+            runs: List[str] = []
+            buffer: List[Tuple[bytes, int]] = []
+            records = layer.records()
+            for index in range(layer.size):
+                reason = self._budget.exceeded(expanded, layer.size - index + len(buffer))
+                if reason is not None:
+                    return Result.stopped(reason, expanded, layer.size - index, generated)
+
+                state = root.from_record(_decode(records[index], width))
+                expanded += 1
+                for a in state.get_possible_actions():
+                    child = state.apply(a)
+                    generated += 1
+                    if child.is_solution():
+                        solution = self._rebuild_solution(root, layers, index, width) + [a]
+                        return Result(depth, expanded, layer.size - index - 1, solution, generated)
+                    buffer.append((_encode(child.get_record(), width), index))
+
+                if len(buffer) >= self._chunk_size:
+                    runs.append(self._write_run(directory, depth, len(runs), buffer, width))
+                    buffer = []
+            del records
+            if buffer:
+                runs.append(self._write_run(directory, depth, len(runs), buffer, width))
+
+            layer = self._merge_runs(directory, depth, runs, layers, width)
+            layers.append(layer)
+            for run in runs:
+                os.remove(run + ".records")
+                os.remove(run + ".parents")
+
+        return Result.empty(expanded, generated)
+
+    @staticmethod
+    def _write_run(directory: str, depth: int, number: int, buffer: List[Tuple[bytes, int]], width: int) -> str:
+        """Writes the successors of buffer sorted by record, only the first one of each record is kept"""
+        records = np.array([r for r, _ in buffer], dtype=f"S{width}")
+        parents = np.array([p for _, p in buffer], dtype=PARENT_DTYPE)
+        order = np.argsort(records, kind="stable")
+        records = records[order]
+        parents = parents[order]
+        first = np.ones(len(records), dtype=bool)
+        first[1:] = records[1:] != records[:-1]
+
+        path = os.path.join(directory, f"run_{depth}_{number}")
+        records[first].tofile(path + ".records")
+        parents[first].tofile(path + ".parents")
+        return path
+
+    def _merge_runs(self, directory: str, depth: int, runs: List[str], layers: List[_Layer], width: int) -> _Layer:
+        """Next layer made of the records of the runs that are not in any previous layer"""
+        # Upper bound of the layer size, the files are truncated to the real size afterwards
+        total = sum(os.path.getsize(run + ".parents") // np.dtype(PARENT_DTYPE).itemsize for run in runs)
+        layer = _Layer(directory, depth, width, total)
+        records, parents = layer.create()
+
+        size = 0
+        previous: Optional[bytes] = None
+        chunk: List[Tuple[bytes, int]] = []
+        for record, parent in heapq.merge(*[_read_run(run, width) for run in runs], key=lambda e: e[0]):
+            # The first run to reach a record has the smallest parent index, as in an in memory search
+            if record == previous:
+                continue
+            previous = record
+            chunk.append((record, parent))
+            if len(chunk) >= self._chunk_size:
+                size = _append_new(chunk, layers, records, parents, size, width)
+                chunk = []
+        if chunk:
+            size = _append_new(chunk, layers, records, parents, size, width)
+
+        records.flush()
+        parents.flush()
+        del records, parents
+        layer.truncate(size)
+        return layer
+
+    @staticmethod
+    def _rebuild_solution(root: State, layers: List[_Layer], index: int, width: int) -> List[Action]:
+        """Actions from the root to the state at index of the last layer, found by replaying the moves of every
+        parent until one reaches its child"""
+        records = []
+        for layer in reversed(layers):
+            records.append(_decode(layer.records()[index], width))
+            index = int(layer.parents()[index])
+        records.reverse()
+
+        solution = []
+        for parent_record, child_record in zip(records, records[1:]):
+            parent = root.from_record(parent_record)
+            solution.append(next(a for a in parent.get_possible_actions()
+                                 if parent.apply(a).get_record() == child_record))
+        return solution
+
+
+def _encode(record: int, width: int) -> bytes:
+    # Big endian, so that sorting the bytes sorts the records
+    return record.to_bytes(width, "big")
+
+
+def _decode(raw: bytes, width: int) -> int:
+    # Numpy drops the trailing zero bytes of fixed width byte strings
+    return int.from_bytes(bytes(raw).ljust(width, b"\0"), "big")
+
+
+def _read_run(path: str, width: int) -> Iterator[Tuple[bytes, int]]:
+    records = np.memmap(path + ".records", dtype=f"S{width}", mode="r")
+    parents = np.memmap(path + ".parents", dtype=PARENT_DTYPE, mode="r")
+    for record, parent in zip(records, parents):
+        yield bytes(record).ljust(width, b"\0"), int(parent)
+
+
+def _append_new(chunk: List[Tuple[bytes, int]], layers: List[_Layer], records: np.memmap, parents: np.memmap,
+                size: int, width: int) -> int:
+    """Appends the sorted records of chunk that are in no previous layer, returns the new size of the layer"""
+    chunk_records = np.array([r for r, _ in chunk], dtype=f"S{width}")
+    new = np.ones(len(chunk), dtype=bool)
+    for layer in layers:
+        new &= ~layer.contains(chunk_records)
+    count = int(new.sum())
+    records[size:size + count] = chunk_records[new]
+    parents[size:size + count] = np.array([p for _, p in chunk], dtype=PARENT_DTYPE)[new]
+    return size + count
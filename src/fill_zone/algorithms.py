@@ -0,0 +1,90 @@
+import math
+from typing import List, Optional, Tuple
+
+from src.algorithms import Algorithm
+from src.fill_zone.action import FillZoneAction
+from src.fill_zone.state import FillZoneGraphState, FillZoneRegionState
+from src.result import Result, SOLVED
+from src.search_tree import SearchTree
+
+REGIONS_SCORE = "regions"
+AREA_SCORE = "area"
+
+
+class LookaheadGreedyAlgorithm(Algorithm):
+    """Anytime greedy solver for boards too big for the exact algorithms.
+
+    Each move is chosen by looking every sequence of up to depth moves ahead and keeping the first move of the
+    sequence that solves the board soonest or, if none does, that floods the most regions or cells. Full games
+    are played with lookaheads of 1, 2, ... up to depth while the search budget lasts, keeping the shortest
+    solution. The first game is always finished, so there is always a solution, and if the budget stops the
+    deeper games the result has the limit reached as status.
+    """
+
+    def __init__(self, depth: int = 2, score: str = REGIONS_SCORE):
+        super().__init__()
+        if score not in [REGIONS_SCORE, AREA_SCORE]:
+            raise ValueError("Unsupported lookahead score")
+        self._depth = depth
+        self._score = score
+
+    def search(self, tree: SearchTree) -> Result:
+        self._budget.start()
+        self._stop_reason: Optional[str] = None
+        self._expanded = 0
+        self._generated = 0
+        best: Optional[List[FillZoneAction]] = None
+        first_solution_time: Optional[float] = None
+
+        for depth in range(1, self._depth + 1):
+            solution = self._play(tree.get_root().get_state(), depth, best)
+            if solution is not None and (best is None or len(solution) < len(best)):
+                best = solution
+                if first_solution_time is None:
+                    first_solution_time = self._budget.get_elapsed()
+            if depth < self._depth and self._out_of_budget():
+                break
+
+        status = SOLVED if self._stop_reason is None else self._stop_reason
+        return Result(len(best), self._expanded, 0, best, self._generated, first_solution_time=first_solution_time,
+                      status=status)
+
+    def _play(self, state: FillZoneGraphState | FillZoneRegionState, depth: int,
+              best: Optional[List[FillZoneAction]]) -> Optional[List[FillZoneAction]]:
+        """Plays a full game choosing moves with the given lookahead, None if it gets out of budget or it can
+        not improve on best"""
+        solution: List[FillZoneAction] = []
+        while not state.is_solution():
+            if best is not None and (len(solution) + 1 >= len(best) or self._out_of_budget()):
+                return None
+            best_action = max(state.get_possible_actions(), key=lambda a: self._evaluate(state.apply(a), depth - 1))
+            state = state.apply(best_action)
+            solution.append(best_action)
+        return solution
+
+    def _evaluate(self, state: FillZoneGraphState | FillZoneRegionState, depth: int) -> Tuple[int, float]:
+        """Value of the best sequence of up to depth moves from state, solving sooner is better than any score"""
+        self._generated += 1
+        if state.is_solution():
+            return 1, depth
+        if depth == 0:
+            return 0, self._get_score(state)
+
+        self._expanded += 1
+        value = (0, -math.inf)
+        for a in state.get_possible_actions():
+            value = max(value, self._evaluate(state.apply(a), depth - 1))
+        return value
+
+    def _get_score(self, state: FillZoneGraphState | FillZoneRegionState) -> int:
+        if self._score == AREA_SCORE:
+            if not isinstance(state, FillZoneRegionState):
+                raise ValueError("The area score needs a bitboard or shared state")
+            return state.get_flooded_area()
+        if isinstance(state, FillZoneRegionState):
+            return state.get_flooded().bit_count()
+        return state.get_absorbed().bit_count()
+
+    def _out_of_budget(self) -> bool:
+        self._stop_reason = self._budget.exceeded(self._expanded)
+        return self._stop_reason is not None
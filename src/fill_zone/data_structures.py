@@ -1,6 +1,10 @@
 from __future__ import annotations
 
 from copy import deepcopy
+from typing import List, Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class Node:
@@ -9,6 +13,9 @@ class Node:
         self._id = node_id
         self.color = color
 
+    def get_id(self) -> int:
+        return self._id
+
     def __str__(self):
         return f"{self._id}. Color#{self.color}"
 
@@ -31,3 +38,91 @@ class Node:
 
     def __hash__(self):
         return hash((self._id, self.color))
+
+
+class RegionGraph:
+    """Immutable region adjacency of a board, shared by every state of a search.
+
+    Regions are numbered once, region ``i`` being the node with id ``i + 1``, and every
+    set of regions is stored as an integer bitmask.
+    """
+
+    def __init__(self, colors: List[int], adjacency: List[int], sizes: List[int]):
+        # numpy is only loaded by the region states, not by the graph states or the 8-puzzle
+        import numpy as np
+
+        self._colors = colors
+        self._adjacency = adjacency
+        self._sizes = np.array(sizes)
+        self._color_masks: Dict[int, int] = {}
+        for region, color in enumerate(colors):
+            self._color_masks[color] = self._color_masks.get(color, 0) | (1 << region)
+        self._full_mask = (1 << len(colors)) - 1
+        # Bits needed to store any color of the board
+        self._color_bits = max(int(max(colors)).bit_length(), 1)
+        self._color_array = np.array(colors)
+        self._distances: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self._colors)
+
+    def get_color(self, region: int) -> int:
+        return self._colors[region]
+
+    def get_colors(self) -> List[int]:
+        return list(self._color_masks.keys())
+
+    def get_color_array(self) -> np.ndarray:
+        """Color of every region"""
+        return self._color_array
+
+    def get_color_bits(self) -> int:
+        return self._color_bits
+
+    def get_color_mask(self, color: int) -> int:
+        return self._color_masks.get(color, 0)
+
+    def get_adjacency(self, region: int) -> int:
+        return self._adjacency[region]
+
+    def get_full_mask(self) -> int:
+        return self._full_mask
+
+    def get_area(self, mask: int) -> int:
+        """Amount of cells of the regions in mask"""
+        return int(self._sizes[self.to_array(mask)].sum())
+
+    def neighbors_of(self, mask: int) -> int:
+        """Union of the neighbors of every region in mask, mask itself included"""
+        neighbors = mask
+        adjacency = self._adjacency
+        while mask:
+            low = mask & -mask
+            neighbors |= adjacency[low.bit_length() - 1]
+            mask ^= low
+        return neighbors
+
+    def to_array(self, mask: int) -> np.ndarray:
+        """Mask as a boolean array indexed by region"""
+        import numpy as np
+
+        raw = np.frombuffer(mask.to_bytes((len(self._colors) + 7) // 8, "little"), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder="little")[:len(self._colors)].astype(bool)
+
+    def get_distances(self) -> np.ndarray:
+        """Matrix of the distances between every pair of regions, computed on first use"""
+        if self._distances is None:
+            import numpy as np
+
+            distances = np.zeros((len(self._colors), len(self._colors)), dtype=np.uint16)
+            for region in range(len(self._colors)):
+                layer = 1 << region
+                seen = layer
+                distance = 0
+                while layer:
+                    distances[region, self.to_array(layer)] = distance
+                    layer = self.neighbors_of(layer) & ~seen
+                    seen |= layer
+                    distance += 1
+            self._distances = distances
+        return self._distances
@@ -1,40 +1,49 @@
-import heapq
-from typing import Set, Dict
+from collections import deque
+from typing import Set, Dict, Deque, List, Optional, TYPE_CHECKING
 
+from src.fill_zone.action import FillZoneAction
 from src.fill_zone.data_structures import Node
-from src.fill_zone.state import FillZoneGraphState
+from src.fill_zone.state import FillZoneGraphState, FillZoneRegionState
 from src.heuristics import Heuristic
 
+if TYPE_CHECKING:
+    import numpy as np
 
-class EccentricityHeuristic(Heuristic):
-    @staticmethod
-    def calculate(state: FillZoneGraphState) -> int:
-        distances: Dict[Node, int] = {state.root: 0}
-        unvisited = [(0, state.root)]
-        max_distance = 0
-
-        while unvisited:
-            (dist, current) = heapq.heappop(unvisited)
 
-            if current in distances and dist > distances[current]:
-                continue
+def _graph_distances(state: FillZoneGraphState) -> Dict[Node, int]:
+    """Distance from the root to every node, edges all weigh 1 so a breadth first search is enough"""
+    distances: Dict[Node, int] = {state.root: 0}
+    queue: Deque[Node] = deque([state.root])
+    while queue:
+        current = queue.popleft()
+        for neighbor in state.graph.neighbors(current):
+            if neighbor not in distances:
+                distances[neighbor] = distances[current] + 1
+                queue.append(neighbor)
+    return distances
 
-            for neighbor in state.graph.neighbors(current):
-                new_distance = distances[current] + 1
 
-                if neighbor not in distances or new_distance < distances[neighbor]:
-                    distances[neighbor] = new_distance
-                    heapq.heappush(unvisited, (new_distance, neighbor))
+def _region_distances(state: FillZoneRegionState) -> "np.ndarray":
+    """Distance from the flooded regions to every region, from the distances between regions of the board.
+    Merging regions into the root never adds paths, so it is the shortest distance from any flooded region"""
+    regions = state.regions
+    return regions.get_distances()[regions.to_array(state.get_flooded())].min(axis=0)
 
-                    if new_distance > max_distance:
-                        max_distance = new_distance
 
-        return max_distance
+class EccentricityHeuristic(Heuristic):
+    @staticmethod
+    def calculate(state: FillZoneGraphState | FillZoneRegionState) -> int:
+        if isinstance(state, FillZoneRegionState):
+            return int(_region_distances(state).max())
+        return max(_graph_distances(state).values())
 
 
 class ColorCountHeuristic(Heuristic):
     @staticmethod
-    def calculate(state: FillZoneGraphState) -> int:
+    def calculate(state: FillZoneGraphState | FillZoneRegionState) -> int:
+        if isinstance(state, FillZoneRegionState):
+            return len(state.get_remaining_colors())
+
         colors: Set[int] = set()
         count: int = 0
 
@@ -47,15 +56,78 @@ class ColorCountHeuristic(Heuristic):
 
         return count
 
+    def calculate_incremental(self, state: FillZoneGraphState | FillZoneRegionState, parent_estimate: int,
+                              action: FillZoneAction) -> int:
+        # Only the color played can disappear, when its last regions are absorbed
+        color = action.get_color()
+        if isinstance(state, FillZoneRegionState):
+            still_present = state.get_remaining() & state.regions.get_color_mask(color) != 0
+        else:
+            still_present = any(n.color == color for n in state.graph.nodes() if n != state.root)
+        return parent_estimate if still_present else parent_estimate - 1
+
 
 class CombinationHeuristic(Heuristic):
     @staticmethod
-    def calculate(state: FillZoneGraphState) -> int:
-        return max([EccentricityHeuristic.calculate(state), ColorCountHeuristic.calculate(state)])
+    def calculate(state: FillZoneGraphState | FillZoneRegionState) -> int:
+        if isinstance(state, FillZoneRegionState):
+            return max(int(_region_distances(state).max()), len(state.get_remaining_colors()))
+
+        # A single pass over the graph gives both the eccentricity and the remaining colors
+        distances = _graph_distances(state)
+        colors = {n.color for n in distances if n != state.root}
+        return max(max(distances.values()), len(colors))
+
+
+def _layered_bound(color_distances: List[int]) -> int:
+    """Lower bound from the distance to the furthest remaining region of each color.
+
+    No region at distance d or more can be absorbed in less than d - 1 moves, and afterwards
+    every color among them still has to be played, so at least d - 1 plus that many colors
+    moves are needed for every d.
+    """
+    distances = sorted((d for d in color_distances if d > 0), reverse=True)
+    return max((d - 1 + i for i, d in enumerate(distances, start=1)), default=0)
+
+
+class LayeredHeuristic(Heuristic):
+    """Admissible, at least as big as the eccentricity and the color count"""
+    @staticmethod
+    def calculate(state: FillZoneGraphState | FillZoneRegionState) -> int:
+        if isinstance(state, FillZoneRegionState):
+            distances = _region_distances(state)
+            colors = state.regions.get_color_array()
+            return _layered_bound([int(distances[colors == c].max()) for c in state.regions.get_colors()])
+
+        color_distances: Dict[int, int] = {}
+        for n, d in _graph_distances(state).items():
+            if n != state.root:
+                color_distances[n.color] = max(color_distances.get(n.color, 0), d)
+        return _layered_bound(list(color_distances.values()))
+
+
+class LookaheadHeuristic(Heuristic):
+    """One move lookahead over an admissible heuristic, by default LayeredHeuristic.
+
+    The next move solves at most one move of the estimate, so one plus the lowest estimate among
+    the children is also admissible. It notices colors that can be finished with a single move
+    and how much each move brings the rest of the board closer, at the cost of evaluating every child.
+    """
+
+    def __init__(self, heuristic: Optional[Heuristic] = None):
+        self._heuristic = heuristic if heuristic is not None else LayeredHeuristic()
+
+    def calculate(self, state: FillZoneGraphState | FillZoneRegionState) -> int:
+        if state.is_solution():
+            return 0
+        lookahead = 1 + min(self._heuristic.calculate(state.apply(a)) for a in state.get_possible_actions())
+        return max(self._heuristic.calculate(state), lookahead)
 
 
 class NodeCountHeuristic(Heuristic):
     """Not admissible"""
     @staticmethod
-    def calculate(state: FillZoneGraphState) -> int:
+    def calculate(state: FillZoneGraphState | FillZoneRegionState) -> int:
+        if isinstance(state, FillZoneRegionState):
+            return state.get_remaining().bit_count() + 1
         return len(state.graph.nodes)
@@ -1,15 +1,19 @@
+from __future__ import annotations
+
 import logging
+from abc import ABC
 from copy import deepcopy
-from queue import Queue
-from typing import Set, Tuple, List, Optional
-
-import networkx as nx
-import numpy as np
+from typing import Set, Tuple, List, Optional, TYPE_CHECKING
 
+from src.board_parser import parse_matrix
 from src.fill_zone.action import FillZoneAction
-from src.fill_zone.data_structures import Node
+from src.fill_zone.data_structures import Node, RegionGraph
 from src.state import State
 
+if TYPE_CHECKING:
+    import networkx as nx
+    import numpy as np
+
 
 class FillZoneGraphState(State):
     def __init__(self, matrix: List[List[int]]):
@@ -17,6 +21,9 @@ class FillZoneGraphState(State):
 
         self._graph = graph
         self._root = root
+        # Every reachable state is determined by the regions absorbed by the root and its color
+        self._absorbed = 1 << (root.get_id() - 1)
+        self._hash = hash((self._absorbed, root.color))
 
     def is_solution(self) -> bool:
         return self._graph.number_of_nodes() == 1
@@ -40,6 +47,7 @@ class FillZoneGraphState(State):
                     if new_state._root != grandchild:
                         new_state._graph.add_edge(grandchild, new_state._root)
                 new_state._graph.remove_node(child)
+                new_state._absorbed |= 1 << (child.get_id() - 1)
 
         root_edges = new_state._graph[new_state._root]
         new_state._graph.remove_node(new_state._root)
@@ -48,6 +56,7 @@ class FillZoneGraphState(State):
         for child in root_edges:
             new_state._graph.add_edge(child, new_state._root)
 
+        new_state._hash = hash((new_state._absorbed, new_state._root.color))
         return new_state
 
     def _merge_to_root(self, child: Node):
@@ -66,11 +75,15 @@ class FillZoneGraphState(State):
         return result
 
     def __eq__(self, other):
-        return isinstance(other, FillZoneGraphState) and nx.utils.graphs_equal(self._graph,
-                                                                               other._graph) and self._root == other._root
+        return isinstance(other, FillZoneGraphState) and self._absorbed == other._absorbed \
+            and self._root.color == other._root.color
 
     def __hash__(self):
-        return hash((nx.weisfeiler_lehman_graph_hash(self._graph), self._root))
+        return self._hash
+
+    def get_absorbed(self) -> int:
+        """Bitmask of the original regions absorbed by the root, region i being the node with id i + 1"""
+        return self._absorbed
 
     def get_neighbors(self, node: Node):
         return self.graph[node]
@@ -84,56 +97,267 @@ class FillZoneGraphState(State):
         return self._graph
 
 
-dxy = [
-    (0, 1),
-    (0, -1),
-    (1, 0),
-    (-1, 0)
-]
+class FillZoneRegionState(State, ABC):
+    """Fill Zone state over the regions of a shared RegionGraph, sets of regions being bitmasks"""
+    __slots__ = ()
+
+    def get_flooded(self) -> int:
+        """Bitmask of the regions flooded by the root"""
+        raise NotImplementedError()
+
+    def get_frontier(self) -> int:
+        """Bitmask of the regions adjacent to the flooded ones"""
+        raise NotImplementedError()
+
+    def _child(self, absorbed: int, color: int) -> FillZoneRegionState:
+        raise NotImplementedError()
+
+    @property
+    def root_color(self) -> int:
+        raise NotImplementedError()
+
+    @property
+    def regions(self) -> RegionGraph:
+        raise NotImplementedError()
+
+    def is_solution(self) -> bool:
+        return self.get_frontier() == 0
+
+    def is_dead(self) -> bool:
+        return False
+
+    def get_possible_actions(self) -> Set[FillZoneAction]:
+        actions = set()
+        frontier = self.get_frontier()
+        for color in self.regions.get_colors():
+            if frontier & self.regions.get_color_mask(color):
+                actions.add(FillZoneAction(color))
+        return actions
+
+    def apply(self, action: FillZoneAction) -> State:
+        color = action.get_color()
+        return self._child(self.get_frontier() & self.regions.get_color_mask(color), color)
+
+    def get_layers(self) -> List[int]:
+        """Masks of the unflooded regions grouped by their distance to the root"""
+        layers = []
+        layer = self.get_frontier()
+        seen = self.get_flooded() | layer
+        while layer:
+            layers.append(layer)
+            layer = self.regions.neighbors_of(layer) & ~seen
+            seen |= layer
+        return layers
+
+    def get_remaining_colors(self) -> Set[int]:
+        remaining = self.get_remaining()
+        return {c for c in self.regions.get_colors() if remaining & self.regions.get_color_mask(c)}
+
+    def get_remaining(self) -> int:
+        return self.regions.get_full_mask() & ~self.get_flooded()
+
+    def get_flooded_area(self) -> int:
+        """Amount of cells flooded by the root"""
+        return self.regions.get_area(self.get_flooded())
+
+    def get_record(self) -> int:
+        return (self.get_flooded() << self.regions.get_color_bits()) | int(self.root_color)
+
+    def get_record_bits(self) -> int:
+        return len(self.regions) + self.regions.get_color_bits()
 
+    def from_record(self, record: int) -> FillZoneRegionState:
+        color_bits = self.regions.get_color_bits()
+        return self._from_masks(record >> color_bits, record & ((1 << color_bits) - 1))
 
-def in_range(x, a, b) -> bool:
-    return a <= x < b
+    def _from_masks(self, flooded: int, color: int) -> FillZoneRegionState:
+        raise NotImplementedError()
+
+    def __eq__(self, other):
+        return isinstance(other, FillZoneRegionState) and self.root_color == other.root_color \
+            and self.get_flooded() == other.get_flooded()
+
+    def __hash__(self):
+        return hash((self.get_flooded(), self.root_color))
+
+
+class FillZoneBitboardState(FillZoneRegionState):
+    """Compact Fill Zone state: the set of regions flooded by the root as a bitmask.
+
+    The region adjacency is computed once per board and shared by every state, so
+    applying an action only ORs together the adjacency masks of the absorbed regions.
+    """
+    __slots__ = ("_regions", "_flooded", "_frontier", "_color")
+
+    def __init__(self, matrix: List[List[int]]):
+        regions = matrix_to_regions(matrix)
+        self._regions = regions
+        self._flooded = 1
+        self._frontier = regions.get_adjacency(0)
+        self._color = regions.get_color(0)
+
+    def _child(self, absorbed: int, color: int) -> FillZoneBitboardState:
+        child = FillZoneBitboardState.__new__(FillZoneBitboardState)
+        child._regions = self._regions
+        child._flooded = self._flooded | absorbed
+        child._frontier = (self._frontier | self._regions.neighbors_of(absorbed)) & ~child._flooded
+        child._color = color
+        return child
+
+    def _from_masks(self, flooded: int, color: int) -> FillZoneBitboardState:
+        state = FillZoneBitboardState.__new__(FillZoneBitboardState)
+        state._regions = self._regions
+        state._flooded = flooded
+        state._frontier = self._regions.neighbors_of(flooded) & ~flooded
+        state._color = color
+        return state
+
+    def get_flooded(self) -> int:
+        return self._flooded
+
+    def get_frontier(self) -> int:
+        return self._frontier
+
+    @property
+    def root_color(self) -> int:
+        return self._color
+
+    @property
+    def regions(self) -> RegionGraph:
+        return self._regions
+
+
+class FillZoneSharedState(FillZoneRegionState):
+    """Slotted bitboard Fill Zone state with a link to its parent.
+
+    A child is created with only the regions merged by its move and a link to its parent, and
+    the flooded regions are rebuilt from the nearest ancestor that has them the first time
+    they are needed and then kept, so each state walks up its parents at most once. Once its
+    mask is known a state holds the same bitboard as a FillZoneBitboardState. It saves memory
+    by not storing the frontier, which is recomputed from the mask when needed.
+    """
+    __slots__ = ("_regions", "_parent", "_delta", "_color", "_flooded")
+
+    def __init__(self, matrix: List[List[int]]):
+        self._regions = matrix_to_regions(matrix)
+        self._parent: Optional[FillZoneSharedState] = None
+        self._delta = 1
+        self._color = self._regions.get_color(0)
+        self._flooded: Optional[int] = self._delta
+
+    def _child(self, absorbed: int, color: int) -> FillZoneSharedState:
+        child = FillZoneSharedState.__new__(FillZoneSharedState)
+        child._regions = self._regions
+        child._parent = self
+        child._delta = absorbed
+        child._color = color
+        child._flooded = None
+        return child
+
+    def _from_masks(self, flooded: int, color: int) -> FillZoneSharedState:
+        state = FillZoneSharedState.__new__(FillZoneSharedState)
+        state._regions = self._regions
+        state._parent = None
+        state._delta = flooded
+        state._color = color
+        state._flooded = flooded
+        return state
+
+    def get_flooded(self) -> int:
+        if self._flooded is None:
+            flooded = 0
+            state = self
+            while state._flooded is None:
+                flooded |= state._delta
+                state = state._parent
+            self._flooded = flooded | state._flooded
+        return self._flooded
+
+    def get_frontier(self) -> int:
+        flooded = self.get_flooded()
+        return self._regions.neighbors_of(flooded) & ~flooded
+
+    def is_solution(self) -> bool:
+        return self.get_flooded() == self._regions.get_full_mask()
+
+    def get_delta(self) -> int:
+        """Bitmask of the regions merged into the root by the move that created this state"""
+        return self._delta
+
+    @property
+    def root_color(self) -> int:
+        return self._color
+
+    @property
+    def regions(self) -> RegionGraph:
+        return self._regions
+
+
+def label_regions(matrix: List[List[int]]) -> Tuple[np.ndarray, List[int], List[int], List[List[int]]]:
+    """Region of every cell, the color and amount of cells of every region and the pairs of adjacent regions.
+
+    Regions are numbered in the order their first cell appears row by row, so the top left cell is in region 0.
+    Every cell starts labelled with its own index and takes the lowest label among itself and its neighbors of
+    the same color until no label changes. Each round also replaces every label by the label of the cell it
+    names, so long regions need few rounds. Adjacent regions are found by comparing the labels shifted by one
+    row and by one column.
+    """
+    import numpy as np
+
+    logging.debug("Parsing graph from matrix %s", matrix)
+    board = np.asarray(matrix)
+    height, width = board.shape
+    labels = np.arange(height * width).reshape(height, width)
+    # Label of no cell, for neighbors of a different color
+    other = height * width
+    same_right = board[:, :-1] == board[:, 1:]
+    same_down = board[:-1] == board[1:]
+    while True:
+        lowest = labels.copy()
+        lowest[:, :-1] = np.minimum(lowest[:, :-1], np.where(same_right, labels[:, 1:], other))
+        lowest[:, 1:] = np.minimum(lowest[:, 1:], np.where(same_right, labels[:, :-1], other))
+        lowest[:-1] = np.minimum(lowest[:-1], np.where(same_down, labels[1:], other))
+        lowest[1:] = np.minimum(lowest[1:], np.where(same_down, labels[:-1], other))
+        # Labels never go above the index of their cell, so the cell a label names is in the same region
+        lowest = lowest.ravel()[lowest]
+        if np.array_equal(lowest, labels):
+            break
+        labels = lowest
+
+    roots, regions, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    regions = regions.reshape(height, width)
+    horizontal = regions[:, :-1] != regions[:, 1:]
+    vertical = regions[:-1] != regions[1:]
+    first = np.concatenate([regions[:, :-1][horizontal], regions[:-1][vertical]])
+    second = np.concatenate([regions[:, 1:][horizontal], regions[1:][vertical]])
+    # Every pair as a single number, lower region first, so that repeated pairs are dropped by a flat sort
+    keys = np.unique(np.minimum(first, second) * len(roots) + np.maximum(first, second))
+    pairs = np.stack([keys // len(roots), keys % len(roots)], axis=1)
+    return regions, board.ravel()[roots].tolist(), sizes.tolist(), pairs.tolist()
 
 
 def matrix_to_graph(matrix: List[List[int]]) -> Tuple[Node, nx.Graph]:
-    logging.info(f"Parsing graph from matrix {matrix}")
-    nodes: List[List[Optional[Node]]] = [[None] * len(matrix[0]) for row in matrix]
-    node_id = 1
+    # networkx is only needed by the graph states, the region states avoid importing it
+    import networkx as nx
+
+    _, colors, _, pairs = label_regions(matrix)
+    nodes = [Node(color, region + 1) for region, color in enumerate(colors)]
     g = nx.Graph()
-    for i in range(len(matrix)):
-        for j in range(len(matrix[0])):
-            if nodes[i][j] is not None:
-                continue
-            curr_color: int = matrix[i][j]
-            curr_node: Node = Node(curr_color, node_id)
-            node_id += 1
-            nodes[i][j] = curr_node
-
-            q: Queue[Tuple[int, int]] = Queue(maxsize=0)
-            q.put((i, j))
-            while not q.empty():
-                curr_pos: Tuple[int, int] = q.get()
-                for dpos in dxy:
-                    new_pos = (curr_pos[0] + dpos[0], curr_pos[1] + dpos[1])
-                    if (not in_range(new_pos[0], 0, len(matrix))) \
-                            or (not in_range(new_pos[1], 0, len(matrix[0]))):
-                        continue
-
-                    if matrix[new_pos[0]][new_pos[1]] == curr_color and nodes[new_pos[0]][new_pos[1]] is None:
-                        q.put((new_pos[0], new_pos[1]))
-                        nodes[new_pos[0]][new_pos[1]] = curr_node
-                    elif matrix[new_pos[0]][new_pos[1]] != curr_color and nodes[new_pos[0]][new_pos[1]] is not None:
-                        neighbor: Node = nodes[new_pos[0]][new_pos[1]]
-                        g.add_edge(neighbor, curr_node)
-
-    logging.info(f"{[[id(cell) for cell in row] for row in nodes]}")
-
-    return nodes[0][0], g
+    g.add_edges_from((nodes[u], nodes[v]) for u, v in pairs)
+    return nodes[0], g
+
+
+def matrix_to_regions(matrix: List[List[int]]) -> RegionGraph:
+    _, colors, sizes, pairs = label_regions(matrix)
+    adjacency = [0] * len(colors)
+    for u, v in pairs:
+        adjacency[u] |= 1 << v
+        adjacency[v] |= 1 << u
+    return RegionGraph(colors, adjacency, sizes)
 
 
 if __name__ == "__main__":
-    mat = np.mat("4,5,5,3;4,3,0,3;3,4,0,2;1,5,1,0").tolist()
+    mat = parse_matrix("4,5,5,3;4,3,0,3;3,4,0,2;1,5,1,0")
 
     state = FillZoneGraphState(mat)
 
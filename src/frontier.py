@@ -0,0 +1,29 @@
+import heapq
+from itertools import count
+from typing import List, Tuple
+
+from .search_tree import STNode
+
+
+class HeapFrontier:
+    """Single threaded priority frontier.
+
+    Entries are (priority, insertion number, node) tuples, so ties are broken by insertion
+    order without ever comparing nodes.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, STNode]] = []
+        self._counter = count()
+
+    def push(self, priority: int, node: STNode):
+        heapq.heappush(self._heap, (priority, next(self._counter), node))
+
+    def pop(self) -> STNode:
+        return heapq.heappop(self._heap)[2]
+
+    def peek_priority(self) -> int:
+        return self._heap[0][0]
+
+    def __len__(self):
+        return len(self._heap)
@@ -0,0 +1,321 @@
+import heapq
+import math
+import multiprocessing
+import os
+import queue
+import time
+from itertools import count
+from multiprocessing import Queue
+from typing import Dict, List, Optional, Tuple
+
+from .action import Action
+from .algorithms import Algorithm
+from .heuristics import Heuristic, CachedHeuristic
+from .result import Result
+from .search_tree import SearchTree
+from .state import State
+
+# Nodes expanded by a worker between two checks of its inbox
+EXPAND_BATCH = 64
+# Seconds between two termination probes
+PROBE_INTERVAL = 0.005
+
+
+def get_owner(record: int, workers: int) -> int:
+    """Worker that owns a state, from the hash of its record, which is the same in every process"""
+    return hash((record,)) % workers
+
+
+class _HdaWorker:
+    """A* over the states owned by one worker, children owned by other workers are sent to them"""
+
+    def __init__(self, number: int, root: State, heuristic: Heuristic, inboxes: List[Queue], coordinator: Queue):
+        self._number = number
+        self._root = root
+        self._heuristic = heuristic
+        self._inboxes = inboxes
+        self._coordinator = coordinator
+        # Entries are (f, insertion number, g, record)
+        self._open: List[Tuple[int, int, int, int]] = []
+        self._counter = count()
+        # Lowest cost found for each state and the record of the parent it was reached from
+        self._best: Dict[int, Tuple[int, Optional[int]]] = {}
+        # Children owned by other workers with their cost, parent and what their estimate is computed from
+        self._outgoing: List[List[Tuple[int, int, int, int, Action]]] = [[] for _ in inboxes]
+        self._incumbent = math.inf
+        self._sent = 0
+        self._received = 0
+        self._expanded = 0
+        self._generated = 0
+        # Estimate and record of the expanded state with the lowest estimate, for the partial solution
+        self._closest: Optional[Tuple[int, int]] = None
+        self._cache_lookups = (heuristic.hits, heuristic.misses) if isinstance(heuristic, CachedHeuristic) else (0, 0)
+
+    def run(self):
+        root_record = self._root.get_record()
+        if get_owner(root_record, len(self._inboxes)) == self._number:
+            self._insert(root_record, 0, None)
+
+        while True:
+            has_work = self._min_f() < self._incumbent
+            try:
+                message = self._inboxes[self._number].get(block=not has_work, timeout=None if has_work else 0.05)
+            except queue.Empty:
+                message = None
+            if message is not None:
+                if not self._handle(message):
+                    return
+                continue
+            if has_work:
+                self._expand_batch()
+                self._flush()
+
+    def _handle(self, message) -> bool:
+        """Processes a message, False when the worker has to stop"""
+        match message[0]:
+            case "nodes":
+                self._received += 1
+                for record, g, parent, parent_estimate, action in message[1]:
+                    self._insert(record, g, parent, parent_estimate, action)
+            case "incumbent":
+                self._incumbent = min(self._incumbent, message[1])
+            case "probe":
+                self._flush()
+                self._coordinator.put(("status", message[1], self._number, self._sent, self._received,
+                                       self._min_f(), self._expanded, len(self._open), self._closest))
+            case "trace":
+                self._coordinator.put(("parent", message[1], self._best[message[1]][1]))
+            case "stop":
+                hits, misses = 0, 0
+                if isinstance(self._heuristic, CachedHeuristic):
+                    # The copy of the heuristic came with the lookups made before the search
+                    hits = self._heuristic.hits - self._cache_lookups[0]
+                    misses = self._heuristic.misses - self._cache_lookups[1]
+                self._coordinator.put(("stats", self._number, self._expanded, self._generated, hits, misses))
+                # Nodes still on their way to other workers are not needed any more
+                for inbox in self._inboxes:
+                    inbox.cancel_join_thread()
+                return False
+        return True
+
+    def _insert(self, record: int, g: int, parent: Optional[int], parent_estimate: Optional[int] = None,
+                action: Optional[Action] = None):
+        best = self._best.get(record)
+        if best is not None and best[0] <= g:
+            return
+        self._best[record] = (g, parent)
+        state = self._root.from_record(record)
+        # Like STNode.get_estimate, the estimate of the parent is updated when it is known
+        if parent_estimate is None:
+            f = g + self._heuristic.calculate(state)
+        else:
+            f = g + self._heuristic.calculate_incremental(state, parent_estimate, action)
+        if f < self._incumbent:
+            heapq.heappush(self._open, (f, next(self._counter), g, record))
+
+    def _min_f(self) -> float:
+        # Entries of states reached again with a lower cost are dropped
+        while self._open and self._best[self._open[0][3]][0] != self._open[0][2]:
+            heapq.heappop(self._open)
+        return self._open[0][0] if self._open else math.inf
+
+    def _expand_batch(self):
+        workers = len(self._inboxes)
+        for _ in range(EXPAND_BATCH):
+            if self._min_f() >= self._incumbent:
+                return
+            f, _, g, record = heapq.heappop(self._open)
+            state = self._root.from_record(record)
+            if state.is_solution():
+                self._incumbent = g
+                self._coordinator.put(("solution", g, record))
+                continue
+
+            self._expanded += 1
+            if self._closest is None or f - g < self._closest[0]:
+                self._closest = (f - g, record)
+            for a in state.get_possible_actions():
+                child = state.apply(a).get_record()
+                self._generated += 1
+                owner = get_owner(child, workers)
+                if owner == self._number:
+                    self._insert(child, g + 1, record, f - g, a)
+                else:
+                    self._outgoing[owner].append((child, g + 1, record, f - g, a))
+
+    def _flush(self):
+        for owner, nodes in enumerate(self._outgoing):
+            if nodes:
+                self._inboxes[owner].put(("nodes", nodes))
+                self._sent += 1
+                self._outgoing[owner] = []
+
+
+class _Coordinator:
+    """Queue of the messages sent by the workers to the coordinator"""
+
+    def __init__(self, messages: Queue, processes: List[multiprocessing.Process]):
+        self._messages = messages
+        self._processes = processes
+
+    def get(self):
+        """Next message, raises RuntimeError if a worker died as it would never answer"""
+        while True:
+            try:
+                return self._messages.get(timeout=0.1)
+            except queue.Empty:
+                for process in self._processes:
+                    if process.exitcode is not None and process.exitcode != 0:
+                        raise RuntimeError(f"HDA* worker exited with code {process.exitcode}")
+
+
+def _run_worker(number: int, root: State, heuristic: Heuristic, inboxes: List[Queue], coordinator: Queue):
+    _HdaWorker(number, root, heuristic, inboxes, coordinator).run()
+
+
+class HdaStarAlgorithm(Algorithm):
+    """Hash distributed A*: every state is owned by one of the worker processes, chosen by the hash of its record.
+
+    Each worker keeps its own open list and best costs, sends the children it does not own to their owners and
+    reopens states reached again with a lower cost. The solution costs found are broadcast so that every worker
+    prunes with the best one, and the search ends when in two consecutive probes every worker has no node with f
+    below that cost and as many node messages were received as were sent, so none is on its way. With an
+    admissible heuristic the solution is optimal. States are exchanged as their State.get_record records.
+
+    The budget is checked by the coordinator once per probe, so the workers may go past a limit by the nodes they
+    expand until the next one. When it stops the search, the path to the expanded state with the lowest estimate
+    is traced as the partial solution.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        super().__init__()
+        self._workers = workers or os.cpu_count()
+
+    def search(self, tree: SearchTree) -> Result:
+        self._budget.start()
+        root = tree.get_root().get_state()
+        if root.is_solution():
+            return Result(0, 0, 0, [])
+        # Fails here rather than in every worker if the states have no records
+        root.get_record()
+
+        inboxes: List[Queue] = [multiprocessing.Queue() for _ in range(self._workers)]
+        coordinator: Queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_run_worker, daemon=True,
+                                             args=(number, root, tree.get_heuristic(), inboxes, coordinator))
+                     for number in range(self._workers)]
+        for process in processes:
+            process.start()
+        try:
+            return self._coordinate(root, inboxes, _Coordinator(coordinator, processes))
+        finally:
+            for process in processes:
+                process.join(1)
+                if process.is_alive():
+                    process.kill()
+            for inbox in inboxes:
+                inbox.cancel_join_thread()
+
+    def _coordinate(self, root: State, inboxes: List[Queue], coordinator: "_Coordinator") -> Result:
+        incumbent = math.inf
+        incumbent_record: Optional[int] = None
+        previous_counts: Optional[Tuple[int, int]] = None
+        wave = 0
+        replies: Dict[int, tuple] = {}
+        for inbox in inboxes:
+            inbox.put(("probe", wave))
+
+        while True:
+            message = coordinator.get()
+            if message[0] == "solution":
+                if message[1] < incumbent:
+                    incumbent, incumbent_record = message[1], message[2]
+                    for inbox in inboxes:
+                        inbox.put(("incumbent", incumbent))
+                continue
+            if message[0] != "status" or message[1] != wave:
+                continue
+
+            replies[message[2]] = message
+            if len(replies) < len(inboxes):
+                continue
+
+            sent = sum(r[3] for r in replies.values())
+            received = sum(r[4] for r in replies.values())
+            expanded = sum(r[6] for r in replies.values())
+            frontier = sum(r[7] for r in replies.values())
+            idle = all(r[5] >= incumbent for r in replies.values())
+            if idle and sent == received and previous_counts == (sent, received):
+                break
+            previous_counts = (sent, received) if idle else None
+
+            reason = self._budget.exceeded(expanded, frontier)
+            if reason is not None:
+                closest = min((r[8] for r in replies.values() if r[8] is not None), default=None)
+                partial = None
+                if closest is not None:
+                    partial = self._trace_solution(root, closest[1], inboxes, coordinator)
+                stats = self._stop(inboxes, coordinator)
+                result = Result.stopped(reason, sum(s[0] for s in stats), frontier, sum(s[1] for s in stats),
+                                        partial)
+                return self._add_stats(result, stats)
+
+            wave += 1
+            replies = {}
+            time.sleep(PROBE_INTERVAL)
+            for inbox in inboxes:
+                inbox.put(("probe", wave))
+
+        solution = None
+        if incumbent_record is not None:
+            solution = self._trace_solution(root, incumbent_record, inboxes, coordinator)
+        stats = self._stop(inboxes, coordinator)
+        expanded = sum(s[0] for s in stats)
+        generated = sum(s[1] for s in stats)
+        if solution is None:
+            return self._add_stats(Result.empty(expanded, generated), stats)
+        return self._add_stats(Result(len(solution), expanded, frontier, solution, generated), stats)
+
+    @staticmethod
+    def _add_stats(result: Result, stats: List[Tuple[int, int, int, int]]) -> Result:
+        result.worker_expanded_nodes = [s[0] for s in stats]
+        # Each worker has its own copy of a cached heuristic
+        result.cache_hits = sum(s[2] for s in stats)
+        result.cache_misses = sum(s[3] for s in stats)
+        return result
+
+    @staticmethod
+    def _trace_solution(root: State, record: int, inboxes: List[Queue], coordinator: "_Coordinator") \
+            -> List[Action]:
+        """Path to the state with the given record. Asks the owner of each state on the path for its parent, then
+        replays the moves between them"""
+        records = [record]
+        while True:
+            inboxes[get_owner(records[-1], len(inboxes))].put(("trace", records[-1]))
+            message = coordinator.get()
+            while message[0] != "parent":
+                message = coordinator.get()
+            if message[2] is None:
+                break
+            records.append(message[2])
+        records.reverse()
+
+        solution = []
+        for parent_record, child_record in zip(records, records[1:]):
+            parent = root.from_record(parent_record)
+            solution.append(next(a for a in parent.get_possible_actions()
+                                 if parent.apply(a).get_record() == child_record))
+        return solution
+
+    @staticmethod
+    def _stop(inboxes: List[Queue], coordinator: "_Coordinator") -> List[Tuple[int, int, int, int]]:
+        """Stops the workers, returns the expanded and generated nodes and heuristic cache hits and misses of each
+        one"""
+        for inbox in inboxes:
+            inbox.put(("stop",))
+        stats: Dict[int, Tuple[int, int, int, int]] = {}
+        while len(stats) < len(inboxes):
+            message = coordinator.get()
+            if message[0] == "stats":
+                stats[message[1]] = message[2:]
+        return [stats[number] for number in range(len(inboxes))]
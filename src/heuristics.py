@@ -1,5 +1,8 @@
 from abc import ABC
+from collections import OrderedDict
+from typing import Optional
 
+from src.action import Action
 from src.state import State
 
 
@@ -8,8 +11,56 @@ class Heuristic(ABC):
     def calculate(state: State) -> int:
         pass
 
+    def calculate_incremental(self, state: State, parent_estimate: int, action: Action) -> int:
+        """Estimate of state, reached by applying action to a state whose estimate was parent_estimate.
+        Heuristics that can update the value of the parent faster than calculating it again override this"""
+        return self.calculate(state)
+
 
 class DummyHeuristic(Heuristic):
     @staticmethod
     def calculate(state: State) -> int:
         return 0
+
+
+class CachedHeuristic(Heuristic):
+    """Memoizes the estimates of another heuristic by state, evicting the least recently used ones
+    once more than max_size states are stored"""
+
+    def __init__(self, heuristic: Heuristic, max_size: int):
+        self._heuristic = heuristic
+        self._max_size = max_size
+        self._cache: OrderedDict[State, int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def calculate(self, state: State) -> int:
+        estimate = self._lookup(state)
+        if estimate is None:
+            estimate = self._heuristic.calculate(state)
+            self._store(state, estimate)
+        return estimate
+
+    def calculate_incremental(self, state: State, parent_estimate: int, action: Action) -> int:
+        estimate = self._lookup(state)
+        if estimate is None:
+            estimate = self._heuristic.calculate_incremental(state, parent_estimate, action)
+            self._store(state, estimate)
+        return estimate
+
+    def _lookup(self, state: State) -> Optional[int]:
+        estimate = self._cache.get(state)
+        if estimate is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._cache.move_to_end(state)
+        return estimate
+
+    def _store(self, state: State, estimate: int):
+        self._cache[state] = estimate
+        if len(self._cache) > self._max_size:
+            self._cache.popitem(last=False)
+
+    def __len__(self):
+        return len(self._cache)
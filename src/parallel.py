@@ -0,0 +1,174 @@
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .budget import MAX_MEMORY_MB, MAX_SECONDS, resource
+from .result import Result
+
+# The task raised an exception
+TASK_ERROR = "error"
+# The worker process died while running the task, for example killed by the kernel when out of memory
+TASK_CRASHED = "crashed"
+
+
+class TaskOutcome:
+    def __init__(self, index: int, result: Optional[Result], seconds: float, status: str,
+                 error: Optional[str] = None):
+        # Position of the task in the input
+        self.index = index
+        # None if the task did not finish
+        self.result = result
+        self.seconds = seconds
+        self.status = status
+        self.error = error
+
+
+def _limit_memory(max_memory_mb: float):
+    """Limits the address space of the process to what it uses now plus max_memory_mb, so that a task that
+    goes over it gets a MemoryError"""
+    used = 0
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm") as f:
+            used = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    limit = used + int(max_memory_mb * 1024 * 1024)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+
+def _work(connection: Connection, solve: Callable[[Any], Result], max_memory_mb: Optional[float]):
+    if max_memory_mb is not None:
+        _limit_memory(max_memory_mb)
+    while True:
+        task = connection.recv()
+        if task is None:
+            return
+        index, payload = task
+        start_time = time.perf_counter()
+        try:
+            result = solve(payload)
+            outcome = TaskOutcome(index, result, time.perf_counter() - start_time, result.status)
+        except MemoryError:
+            outcome = TaskOutcome(index, None, time.perf_counter() - start_time, MAX_MEMORY_MB, "out of memory")
+        except Exception as e:
+            outcome = TaskOutcome(index, None, time.perf_counter() - start_time, TASK_ERROR, str(e) or repr(e))
+        connection.send(outcome)
+
+
+class _Worker:
+    def __init__(self, solve: Callable[[Any], Result], max_memory_mb: Optional[float]):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_work, args=(child_connection, solve, max_memory_mb),
+                                               daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.index: Optional[int] = None
+        self.start_time = 0.0
+
+    def assign(self, index: int, payload: Any):
+        self.index = index
+        self.start_time = time.perf_counter()
+        self.connection.send((index, payload))
+
+    def stop(self):
+        if self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class ParallelSolver:
+    """Runs independent searches in a pool of worker processes, each task being handed to the first idle worker.
+
+    Every worker runs one task at a time, so a task that crashes its worker only loses that task: it is reported
+    as TASK_CRASHED and the worker is replaced. A task still running after task_timeout seconds has its worker
+    killed and is reported as MAX_SECONDS, and with max_memory_mb every worker gets a MemoryError, reported as
+    MAX_MEMORY_MB, when it allocates that many MB more than it used at start. The tasks are sent as they are to
+    the workers, so they should be small descriptions of the problems rather than built states.
+    """
+
+    def __init__(self, solve: Callable[[Any], Result], workers: Optional[int] = None,
+                 task_timeout: Optional[float] = None, max_memory_mb: Optional[float] = None, ordered: bool = True):
+        if max_memory_mb is not None and resource is None:
+            raise ValueError("The memory limit is not supported on this platform")
+        self._solve = solve
+        self._workers = workers or os.cpu_count()
+        self._task_timeout = task_timeout
+        self._max_memory_mb = max_memory_mb
+        self._ordered = ordered
+
+    def run(self, tasks: Iterable[Any]) -> Iterator[TaskOutcome]:
+        """Outcome of every task, in the order of the tasks if ordered or as soon as each one finishes"""
+        pending = enumerate(tasks)
+        workers: List[_Worker] = []
+        finished: Dict[int, TaskOutcome] = {}
+        next_index = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and (len(workers) < self._workers or any(w.index is None for w in workers)):
+                    task = next(pending, None)
+                    if task is None:
+                        exhausted = True
+                        break
+                    worker = next((w for w in workers if w.index is None), None)
+                    if worker is None:
+                        worker = _Worker(self._solve, self._max_memory_mb)
+                        workers.append(worker)
+                    worker.assign(*task)
+
+                busy = [w for w in workers if w.index is not None]
+                if not busy:
+                    break
+
+                for outcome in self._wait(busy, workers):
+                    if not self._ordered:
+                        yield outcome
+                        continue
+                    finished[outcome.index] = outcome
+                    while next_index in finished:
+                        yield finished.pop(next_index)
+                        next_index += 1
+        finally:
+            for worker in workers:
+                worker.stop()
+
+    def _wait(self, busy: List[_Worker], workers: List[_Worker]) -> List[TaskOutcome]:
+        """Waits until a busy worker finishes, dies or runs out of time, replacing the dead ones"""
+        timeout = None
+        if self._task_timeout is not None:
+            now = time.perf_counter()
+            timeout = max(0.0, min(w.start_time + self._task_timeout - now for w in busy))
+        wait([w.connection for w in busy] + [w.process.sentinel for w in busy], timeout)
+
+        outcomes = []
+        for worker in busy:
+            seconds = time.perf_counter() - worker.start_time
+            outcome = None
+            if worker.connection.poll():
+                try:
+                    outcome = worker.connection.recv()
+                except (EOFError, OSError):
+                    outcome = TaskOutcome(worker.index, None, seconds, TASK_CRASHED, "worker pipe closed")
+            elif not worker.process.is_alive():
+                outcome = TaskOutcome(worker.index, None, seconds, TASK_CRASHED,
+                                      f"worker exited with code {worker.process.exitcode}")
+            elif self._task_timeout is not None and seconds >= self._task_timeout:
+                outcome = TaskOutcome(worker.index, None, seconds, MAX_SECONDS, "task timed out")
+            if outcome is None:
+                continue
+
+            outcomes.append(outcome)
+            if outcome.status in [TASK_CRASHED, MAX_SECONDS] and outcome.result is None:
+                # The process is dead or stuck, a new one takes its place
+                worker.stop()
+                workers[workers.index(worker)] = _Worker(self._solve, self._max_memory_mb)
+            else:
+                worker.index = None
+        return outcomes
@@ -1,18 +1,47 @@
-from typing import List
+from typing import List, Optional
 
 from src.action import Action
 
+SOLVED = "solved"
+# The whole search space was explored without finding a solution
+EXHAUSTED = "exhausted"
+
 
 class Result:
-    def __init__(self, cost: int, expanded_nodes: int, frontier_nodes: int, solution: List[Action]):
+    def __init__(self, cost: int, expanded_nodes: int, frontier_nodes: int, solution: List[Action],
+                 generated_nodes: int = 0, cache_hits: int = 0, cache_misses: int = 0,
+                 first_solution_time: Optional[float] = None, suboptimality_bound: Optional[float] = None,
+                 status: str = SOLVED, partial_solution: Optional[List[Action]] = None,
+                 worker_expanded_nodes: Optional[List[int]] = None):
         self.cost = cost
         self.expanded_nodes = expanded_nodes
         self.frontier_nodes = frontier_nodes
         self.solution = solution
+        self.generated_nodes = generated_nodes
+        # Heuristic cache lookups during the search, only with a CachedHeuristic
+        self.cache_hits = cache_hits
+        self.cache_misses = cache_misses
+        # Seconds until the first solution was found, only for anytime algorithms
+        self.first_solution_time = first_solution_time
+        # The cost is at most this many times the optimal, only for anytime algorithms
+        self.suboptimality_bound = suboptimality_bound
+        # SOLVED, EXHAUSTED or the name of the budget limit that stopped the search, anytime algorithms may still
+        # have found a solution before it
+        self.status = status
+        # Path to the node with the lowest estimate expanded before a budget limit stopped the search
+        self.partial_solution = partial_solution
+        # Nodes expanded by each process, only for parallel algorithms
+        self.worker_expanded_nodes = worker_expanded_nodes
+
+    @classmethod
+    def empty(cls, expanded_nodes: int, generated_nodes: int = 0):
+        return cls(0, expanded_nodes, 0, [], generated_nodes, status=EXHAUSTED)
 
     @classmethod
-    def empty(cls, expanded_nodes: int):
-        return cls(0, expanded_nodes, 0, [])
+    def stopped(cls, reason: str, expanded_nodes: int, frontier_nodes: int, generated_nodes: int,
+                partial_solution: Optional[List[Action]] = None):
+        return cls(0, expanded_nodes, frontier_nodes, [], generated_nodes, status=reason,
+                   partial_solution=partial_solution)
 
     def is_empty(self):
         return len(self.solution) == 0
@@ -1,18 +1,23 @@
 from __future__ import annotations
 
 import functools
-from typing import Set, Optional
+from typing import Optional, List, Iterator
 
 from .action import Action
-from .heuristics import Heuristic
+from .heuristics import Heuristic, CachedHeuristic
 from .result import Result
 from .state import State
 
 
 class SearchTree:
-    def __init__(self, initial_state: State, heuristic: Heuristic):
+    def __init__(self, initial_state: State, heuristic: Heuristic, track_children: bool = False):
+        """
+        With track_children every node keeps the children it expanded, so the whole tree can be inspected or
+        drawn after the search. Otherwise nodes only point to their parent and the ones left out of the search
+        are freed.
+        """
         self._heuristic = heuristic
-        self._root = STNode(self, initial_state, 0, None, None)
+        self._root = STNode(heuristic, initial_state, 0, None, None, [] if track_children else None)
 
     def get_root(self):
         return self._root
@@ -21,29 +26,63 @@ class SearchTree:
         return self._heuristic
 
     def search(self, algorithm) -> Result:
-        return algorithm.search(self)
+        if not isinstance(self._heuristic, CachedHeuristic):
+            return algorithm.search(self)
+
+        hits, misses = self._heuristic.hits, self._heuristic.misses
+        result: Result = algorithm.search(self)
+        # Added to what the algorithm counted itself, like the parallel ones with a copy of the heuristic per process
+        result.cache_hits += self._heuristic.hits - hits
+        result.cache_misses += self._heuristic.misses - misses
+        return result
+
+    def solutions(self, algorithm) -> Iterator[Result]:
+        """Every improved solution of an anytime algorithm, with the heuristic cache lookups made until each one"""
+        if not isinstance(self._heuristic, CachedHeuristic):
+            yield from algorithm.solutions(self)
+            return
+
+        hits, misses = self._heuristic.hits, self._heuristic.misses
+        for result in algorithm.solutions(self):
+            result.cache_hits = self._heuristic.hits - hits
+            result.cache_misses = self._heuristic.misses - misses
+            yield result
 
 
 @functools.total_ordering
 class STNode:  # Search Tree Node
-    def __init__(self, search_tree: SearchTree, state: State, cost: int, parent: Optional[STNode],
-                 action: Optional[Action]):
+    __slots__ = ("_parent", "_action", "_heuristic", "_cost", "_estimate", "_state", "_children")
+
+    def __init__(self, heuristic: Heuristic, state: State, cost: int, parent: Optional[STNode],
+                 action: Optional[Action], children: Optional[List[STNode]] = None):
         self._parent = parent
         self._action = action
-        self._search_tree = search_tree
+        self._heuristic = heuristic
         self._cost = cost
-        self._estimate = search_tree.get_heuristic().calculate(state)
+        # Evaluated on first use, so that nodes discarded as duplicates never pay for the heuristic
+        self._estimate: Optional[int] = None
         self._state = state
-        self._children = set()
+        # Only kept when the search tree tracks children
+        self._children = children
 
     def get_estimate(self):
+        if self._estimate is None:
+            if self._parent is not None and self._parent._estimate is not None:
+                self._estimate = self._heuristic.calculate_incremental(self._state, self._parent._estimate,
+                                                                       self._action)
+            else:
+                self._estimate = self._heuristic.calculate(self._state)
         return self._estimate
 
     def get_cost(self):
         return self._cost
 
-    def add_child(self, child: STNode):
-        self._children.add(child)
+    def get_state(self) -> State:
+        return self._state
+
+    def get_children(self) -> Optional[List[STNode]]:
+        """Expanded children, None if the search tree does not track them"""
+        return self._children
 
     def is_solution(self) -> bool:
         return self._state.is_solution()
@@ -55,7 +94,7 @@ class STNode:  # Search Tree Node
         return self._action
 
     def __lt__(self, other: STNode):
-        return (self._cost + self._estimate) < (other._cost + other._estimate)
+        return (self._cost + self.get_estimate()) < (other._cost + other.get_estimate())
 
     def __eq__(self, other: STNode):
         return isinstance(other, STNode) and self._state == other._state
@@ -66,12 +105,16 @@ class STNode:  # Search Tree Node
     def __repr__(self):
         return str(self._state)
 
-    def expand(self) -> Set[STNode]:
-        actions: Set[Action] = self._state.get_possible_actions()
-        new_nodes: Set[STNode] = set()
-        for a in actions:
-            new_state: State = self._state.apply(a)
-            new_node: STNode = STNode(self._search_tree, new_state, self._cost + 1, self, a)
-            self.add_child(new_node)
-            new_nodes.add(new_node)
+    def generate(self) -> Iterator[STNode]:
+        """Children of the node built one at a time, without keeping them as children"""
+        for a in self._state.get_possible_actions():
+            yield STNode(self._heuristic, self._state.apply(a), self._cost + 1, self, a,
+                         None if self._children is None else [])
+
+    def expand(self) -> List[STNode]:
+        # Children follow the order of the actions so that every state representation of the same
+        # game visits them in the same order and reaches the same result
+        new_nodes: List[STNode] = list(self.generate())
+        if self._children is not None:
+            self._children.extend(new_nodes)
         return new_nodes
@@ -7,6 +7,7 @@ from .action import Action
 
 
 class State(ABC):
+    __slots__ = ()
 
     def is_solution(self) -> bool:
         raise NotImplementedError()
@@ -19,3 +20,21 @@ class State(ABC):
 
     def apply(self, action: Action) -> State:
         raise NotImplementedError()
+
+    def reverse(self) -> State:
+        """Initial state of the reverse problem, which starts at the goal and whose goal is this state.
+        Only needed by bidirectional searches"""
+        raise NotImplementedError()
+
+    def get_record(self) -> int:
+        """State packed in a non negative integer of at most get_record_bits() bits, equal states having equal
+        records. Only needed by external memory searches"""
+        raise NotImplementedError()
+
+    def get_record_bits(self) -> int:
+        """Bits needed by the record of any state of the same problem"""
+        raise NotImplementedError()
+
+    def from_record(self, record: int) -> State:
+        """State of the same problem as this one with the given record"""
+        raise NotImplementedError()
@@ -4,7 +4,7 @@ from .fill_zone.heuristics import EccentricityHeuristic, ColorCountHeuristic
 
 
 def get_all_algorithms() -> List[Algorithm]:
-    ans = [DfsAlgorithm(), BfsAlgorithm(), AStarAlgorithm(), GreedyAlgorithm()]
+    ans = [DfsAlgorithm(), BfsAlgorithm(), AStarAlgorithm(), GreedyAlgorithm(), IddfsAlgorithm(), IdaStarAlgorithm()]
     return ans
 
 
@@ -1,13 +1,14 @@
 from queue import Queue
 from typing import Set
 
-import matplotlib.pyplot as plt
-import networkx as nx
-
 from src.fill_zone.data_structures import Node
 
 
 def draw_graph(root: Node):
+    # Plotting libraries are slow to import and only needed here
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
     q: Queue[Node] = Queue(maxsize=0)
     g: nx.Graph = nx.Graph()
     q.put(root)
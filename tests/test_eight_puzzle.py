@@ -0,0 +1,124 @@
+import random
+from typing import List, Optional
+
+from src.algorithms import BfsAlgorithm, AStarAlgorithm, BidirectionalBfsAlgorithm, BidirectionalAStarAlgorithm
+from src.eight_puzzle.action import EightPuzzleAction
+from src.eight_puzzle.heuristics import OutOfPlaceHeuristic, ManhattanHeuristic, PatternDatabaseHeuristic
+from src.eight_puzzle.state import EightPuzzleMatrixState, EightPuzzlePackedState
+from src.external_bfs import ExternalBfsAlgorithm
+from src.hda_star import HdaStarAlgorithm
+from src.heuristics import DummyHeuristic
+from src.result import EXHAUSTED
+from src.search_tree import SearchTree
+
+GOAL = [[1, 2, 3], [8, None, 4], [7, 6, 5]]
+
+
+def scramble(moves: int, seed: int) -> List[List[Optional[int]]]:
+    rng = random.Random(seed)
+    state = EightPuzzleMatrixState(GOAL, GOAL)
+    for _ in range(moves):
+        state = state.apply(rng.choice(sorted(state.get_possible_actions(), key=repr)))
+    return state.get_matrix()
+
+
+def apply_all(state: EightPuzzleMatrixState, solution) -> EightPuzzleMatrixState:
+    for a in solution:
+        state = state.apply(a)
+    return state
+
+
+def test_bidirectional_searches_find_optimal_solution():
+    for seed in range(5):
+        start = EightPuzzleMatrixState(scramble(25, seed), GOAL)
+        expected = SearchTree(start, DummyHeuristic()).search(BfsAlgorithm())
+        for algorithm, heuristic in [(BidirectionalBfsAlgorithm(), DummyHeuristic()),
+                                     (BidirectionalAStarAlgorithm(), OutOfPlaceHeuristic()),
+                                     (AStarAlgorithm(), OutOfPlaceHeuristic())]:
+            result = SearchTree(start, heuristic).search(algorithm)
+            assert result.cost == expected.cost == len(result.solution)
+            assert apply_all(start, result.solution).is_solution()
+        assert SearchTree(start, DummyHeuristic()).search(BidirectionalBfsAlgorithm()).expanded_nodes \
+            < expected.expanded_nodes
+
+
+def test_packed_state_matches_matrix_state():
+    for seed in range(5):
+        board = scramble(20, seed)
+        for algorithm, heuristic in [(BfsAlgorithm(), DummyHeuristic()), (AStarAlgorithm(), ManhattanHeuristic()),
+                                     (AStarAlgorithm(), OutOfPlaceHeuristic()),
+                                     (BidirectionalAStarAlgorithm(), ManhattanHeuristic())]:
+            expected = SearchTree(EightPuzzleMatrixState(board, GOAL), heuristic).search(algorithm)
+            result = SearchTree(EightPuzzlePackedState(board, GOAL), heuristic).search(algorithm)
+            assert result.cost == expected.cost
+            assert result.expanded_nodes == expected.expanded_nodes
+            assert apply_all(EightPuzzlePackedState(board, GOAL), result.solution).is_solution()
+
+
+def test_external_bfs_matches_bfs(tmp_path):
+    for seed in range(3):
+        start = EightPuzzlePackedState(scramble(20, seed), GOAL)
+        expected = SearchTree(start, DummyHeuristic()).search(BfsAlgorithm())
+        result = SearchTree(start, DummyHeuristic()).search(ExternalBfsAlgorithm(str(tmp_path), chunk_size=100))
+        assert result.cost == expected.cost == len(result.solution)
+        assert apply_all(start, result.solution).is_solution()
+    assert list(tmp_path.iterdir()) == []
+
+    # Goal of the other parity, every one of the 4! / 2 reachable states is expanded
+    start = EightPuzzlePackedState([[2, 1], [3, None]], [[1, 2], [3, None]])
+    result = SearchTree(start, DummyHeuristic()).search(ExternalBfsAlgorithm(str(tmp_path), chunk_size=3))
+    assert result.status == EXHAUSTED
+    assert result.expanded_nodes == 12
+
+
+def test_hda_star_matches_a_star():
+    for seed in range(3):
+        start = EightPuzzlePackedState(scramble(30, seed), GOAL)
+        expected = SearchTree(start, OutOfPlaceHeuristic()).search(AStarAlgorithm())
+        result = SearchTree(start, OutOfPlaceHeuristic()).search(HdaStarAlgorithm(2))
+        assert result.cost == expected.cost == len(result.solution)
+        assert apply_all(start, result.solution).is_solution()
+
+    start = EightPuzzlePackedState([[2, 1], [3, None]], [[1, 2], [3, None]])
+    result = SearchTree(start, DummyHeuristic()).search(HdaStarAlgorithm(2))
+    assert result.status == EXHAUSTED
+    assert result.expanded_nodes == 12
+
+
+def test_pattern_database_is_admissible_and_persisted(tmp_path):
+    heuristic = PatternDatabaseHeuristic(cache_dir=str(tmp_path))
+    for seed in range(5):
+        start = EightPuzzlePackedState(scramble(30, seed), GOAL)
+        expected = SearchTree(start, DummyHeuristic()).search(BidirectionalBfsAlgorithm())
+        assert heuristic.calculate(start) <= expected.cost
+        result = SearchTree(start, heuristic).search(AStarAlgorithm())
+        assert result.cost == expected.cost
+        assert result.expanded_nodes <= SearchTree(start, OutOfPlaceHeuristic()).search(AStarAlgorithm()).expanded_nodes
+    assert len(list(tmp_path.iterdir())) == 2
+
+    loaded = PatternDatabaseHeuristic(cache_dir=str(tmp_path))
+    start = EightPuzzleMatrixState(scramble(30, 0), GOAL)
+    assert loaded.calculate(start) == heuristic.calculate(start)
+
+
+def test_pattern_database_supports_bigger_boards(tmp_path):
+    goal = [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12], [13, 14, 15, None]]
+    heuristic = PatternDatabaseHeuristic([[1, 2, 5], [3, 4, 8], [6, 7, 9]], str(tmp_path))
+    state = EightPuzzlePackedState(goal, goal)
+    assert heuristic.calculate(state) == 0
+    for a in [EightPuzzleAction.UP, EightPuzzleAction.LEFT, EightPuzzleAction.UP, EightPuzzleAction.LEFT]:
+        state = state.apply(a)
+    assert 0 < heuristic.calculate(state) <= 4
+
+
+def test_incremental_heuristics_match_calculate():
+    rng = random.Random(0)
+    for heuristic in [OutOfPlaceHeuristic(), ManhattanHeuristic()]:
+        for cls in [EightPuzzleMatrixState, EightPuzzlePackedState]:
+            state = cls(scramble(10, 1), GOAL)
+            estimate = heuristic.calculate(state)
+            for _ in range(50):
+                action = rng.choice(sorted(state.get_possible_actions(), key=repr))
+                state = state.apply(action)
+                estimate = heuristic.calculate_incremental(state, estimate, action)
+                assert estimate == heuristic.calculate(state)
@@ -0,0 +1,367 @@
+import io
+import json
+import random
+from typing import List
+
+import pytest
+
+from main import run_batch, run_fill_zone, run_eight_puzzle, RECORD_ALGORITHMS
+from src.algorithms import BfsAlgorithm, DfsAlgorithm, GreedyAlgorithm, AStarAlgorithm, \
+    WeightedAStarAlgorithm, AraStarAlgorithm, BeamSearchAlgorithm, IddfsAlgorithm, IdaStarAlgorithm, \
+    GENERATION_DUPLICATE_DETECTION
+from src.board import Board
+from src.budget import SearchBudget, MAX_EXPANDED, MAX_FRONTIER, MAX_SECONDS, MAX_MEMORY_MB
+from src.external_bfs import ExternalBfsAlgorithm
+from src.fill_zone.action import FillZoneAction
+from src.fill_zone.algorithms import LookaheadGreedyAlgorithm, REGIONS_SCORE, AREA_SCORE
+from src.fill_zone.heuristics import EccentricityHeuristic, ColorCountHeuristic, CombinationHeuristic, \
+    NodeCountHeuristic, LayeredHeuristic, LookaheadHeuristic
+from src.fill_zone.state import FillZoneGraphState, FillZoneBitboardState, FillZoneSharedState, label_regions
+from src.hda_star import HdaStarAlgorithm
+from src.heuristics import DummyHeuristic, CachedHeuristic
+from src.parallel import TASK_ERROR
+from src.result import SOLVED
+from src.search_tree import SearchTree
+
+
+def random_boards(count: int, size: int, colors: int, seed: int = 0) -> List[List[List[int]]]:
+    rng = random.Random(seed)
+    return [[[rng.randrange(colors) for _ in range(size)] for _ in range(size)] for _ in range(count)]
+
+
+def test_region_states_match_graph():
+    pairs = [
+        (BfsAlgorithm(), DummyHeuristic()),
+        (DfsAlgorithm(), DummyHeuristic()),
+        (AStarAlgorithm(), EccentricityHeuristic()),
+        (AStarAlgorithm(), ColorCountHeuristic()),
+        (AStarAlgorithm(), CombinationHeuristic()),
+        (GreedyAlgorithm(), NodeCountHeuristic()),
+    ]
+    for matrix in random_boards(5, 4, 4):
+        for algorithm, heuristic in pairs:
+            expected = SearchTree(FillZoneGraphState(matrix), heuristic).search(algorithm)
+            for cls in [FillZoneBitboardState, FillZoneSharedState]:
+                result = SearchTree(cls(matrix), heuristic).search(algorithm)
+                assert result.cost == expected.cost
+                assert result.expanded_nodes == expected.expanded_nodes
+                assert result.frontier_nodes == expected.frontier_nodes
+                assert result.solution == expected.solution
+                assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+
+def test_label_regions_numbers_regions_by_first_cell():
+    # Region 0 winds around the board, so it only meets itself again after many labelling rounds
+    matrix = [
+        [0, 0, 0, 0],
+        [1, 1, 1, 0],
+        [0, 0, 0, 0],
+        [0, 2, 2, 2],
+        [0, 0, 0, 3],
+    ]
+    regions, colors, sizes, pairs = label_regions(matrix)
+    assert regions.tolist() == [
+        [0, 0, 0, 0],
+        [1, 1, 1, 0],
+        [0, 0, 0, 0],
+        [0, 2, 2, 2],
+        [0, 0, 0, 3],
+    ]
+    assert colors == [0, 1, 2, 3]
+    assert sizes == [13, 3, 3, 1]
+    assert pairs == [[0, 1], [0, 2], [0, 3], [2, 3]]
+
+    regions, colors, sizes, pairs = label_regions([[5, 5], [5, 5]])
+    assert (colors, sizes, pairs) == ([5], [4], [])
+
+def test_generation_duplicate_detection_keeps_optimal_cost():
+    for matrix in random_boards(5, 5, 4, seed=1):
+        for algorithm_class, heuristic in [(BfsAlgorithm, DummyHeuristic()), (AStarAlgorithm, CombinationHeuristic())]:
+            expected = SearchTree(FillZoneBitboardState(matrix), heuristic).search(algorithm_class())
+            result = SearchTree(FillZoneBitboardState(matrix), heuristic).search(
+                algorithm_class(GENERATION_DUPLICATE_DETECTION))
+            assert result.cost == expected.cost
+            assert result.generated_nodes <= expected.generated_nodes
+            assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+
+def test_iterative_deepening_finds_optimal_cost():
+    for matrix in random_boards(3, 4, 4, seed=2):
+        expected = SearchTree(FillZoneBitboardState(matrix), DummyHeuristic()).search(BfsAlgorithm())
+        for algorithm, heuristic in [(IddfsAlgorithm(), DummyHeuristic()), (IdaStarAlgorithm(), CombinationHeuristic())]:
+            result = SearchTree(FillZoneBitboardState(matrix), heuristic).search(algorithm)
+            assert result.cost == expected.cost
+            assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+
+def test_weighted_a_star_and_beam_search_return_valid_solutions():
+    for matrix in random_boards(3, 5, 4, seed=5):
+        optimal = SearchTree(FillZoneBitboardState(matrix), CombinationHeuristic()).search(AStarAlgorithm())
+        for weight in [1, 1.5, 3]:
+            result = SearchTree(FillZoneBitboardState(matrix), CombinationHeuristic()) \
+                .search(WeightedAStarAlgorithm(weight))
+            assert result.cost <= weight * optimal.cost
+            assert Board([row[:] for row in matrix]).check_solution(result.solution)
+        for width in [1, 10]:
+            result = SearchTree(FillZoneBitboardState(matrix), ColorCountHeuristic()).search(BeamSearchAlgorithm(width))
+            assert result.cost >= optimal.cost
+            assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+
+def test_ara_star_streams_improving_solutions_until_optimal():
+    for matrix in random_boards(3, 5, 4, seed=6):
+        optimal = SearchTree(FillZoneBitboardState(matrix), CombinationHeuristic()).search(AStarAlgorithm())
+        results = list(AraStarAlgorithm(3, 1).solutions(SearchTree(FillZoneBitboardState(matrix),
+                                                                   CombinationHeuristic())))
+        assert len(results) > 0
+        for previous, result in zip(results, results[1:]):
+            assert result.cost <= previous.cost
+            assert result.expanded_nodes >= previous.expanded_nodes
+        for result in results:
+            assert result.cost <= result.suboptimality_bound * optimal.cost
+            assert Board([row[:] for row in matrix]).check_solution(result.solution)
+        assert results[-1].cost == optimal.cost
+        assert results[-1].suboptimality_bound == 1
+
+
+def test_search_tree_only_tracks_children_on_request():
+    matrix = random_boards(1, 4, 4, seed=10)[0]
+    tree = SearchTree(FillZoneBitboardState(matrix), DummyHeuristic())
+    tree.search(BfsAlgorithm())
+    assert tree.get_root().get_children() is None
+
+    tree = SearchTree(FillZoneBitboardState(matrix), DummyHeuristic(), track_children=True)
+    result = tree.search(BfsAlgorithm())
+    children = tree.get_root().get_children()
+    assert [c.get_action() for c in children] == list(tree.get_root().get_state().get_possible_actions())
+    assert all(c.get_parent() is tree.get_root() for c in children)
+    assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+
+def test_external_bfs_finds_optimal_cost(tmp_path):
+    for matrix in random_boards(3, 5, 4, seed=11):
+        expected = SearchTree(FillZoneBitboardState(matrix), DummyHeuristic()).search(BfsAlgorithm())
+        for state in [FillZoneBitboardState(matrix), FillZoneSharedState(matrix)]:
+            result = SearchTree(state, DummyHeuristic()).search(ExternalBfsAlgorithm(str(tmp_path), chunk_size=5))
+            assert result.cost == expected.cost
+            assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+
+def test_hda_star_finds_optimal_cost():
+    for matrix in random_boards(3, 6, 4, seed=13):
+        expected = SearchTree(FillZoneBitboardState(matrix), CombinationHeuristic()).search(AStarAlgorithm())
+        result = SearchTree(FillZoneBitboardState(matrix), CombinationHeuristic()).search(HdaStarAlgorithm(3))
+        assert result.cost == expected.cost
+        assert len(result.worker_expanded_nodes) == 3
+        assert sum(result.worker_expanded_nodes) == result.expanded_nodes
+        assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+
+def test_hda_star_budget_stop_traces_partial_solution():
+    matrix = random_boards(1, 10, 6, seed=9)[0]
+    algorithm = HdaStarAlgorithm(2)
+    algorithm.set_budget(SearchBudget(max_expanded=50))
+    result = SearchTree(FillZoneBitboardState(matrix), CombinationHeuristic()).search(algorithm)
+    assert result.status == MAX_EXPANDED
+    assert result.expanded_nodes >= 50
+    state = FillZoneBitboardState(matrix)
+    assert len(result.partial_solution) > 0
+    for action in result.partial_solution:
+        assert action in state.get_possible_actions()
+        state = state.apply(action)
+
+
+def test_hda_star_and_ara_star_count_heuristic_cache_lookups():
+    matrix = random_boards(1, 6, 4, seed=14)[0]
+    expected = SearchTree(FillZoneBitboardState(matrix), ColorCountHeuristic()).search(AStarAlgorithm())
+
+    heuristic = CachedHeuristic(ColorCountHeuristic(), 1000)
+    # Lookups made before the search are not counted by it
+    heuristic.calculate(FillZoneBitboardState(matrix))
+    result = SearchTree(FillZoneBitboardState(matrix), heuristic).search(HdaStarAlgorithm(2))
+    assert result.cost == expected.cost
+    assert result.cache_misses > 0
+    assert result.cache_hits + result.cache_misses <= result.generated_nodes + 1
+
+    heuristic = CachedHeuristic(ColorCountHeuristic(), 1000)
+    results = list(SearchTree(FillZoneBitboardState(matrix), heuristic).solutions(AraStarAlgorithm()))
+    assert results[-1].cost == expected.cost
+    assert results[-1].cache_hits + results[-1].cache_misses == heuristic.hits + heuristic.misses > 0
+
+
+def test_incremental_color_count_matches_calculate():
+    heuristic = ColorCountHeuristic()
+    rng = random.Random(3)
+    for matrix in random_boards(5, 6, 5, seed=3):
+        for cls in [FillZoneGraphState, FillZoneBitboardState, FillZoneSharedState]:
+            state = cls(matrix)
+            estimate = heuristic.calculate(state)
+            while not state.is_solution():
+                action = rng.choice(sorted(state.get_possible_actions(), key=lambda a: a.get_color()))
+                state = state.apply(action)
+                estimate = heuristic.calculate_incremental(state, estimate, action)
+                assert estimate == heuristic.calculate(state)
+
+
+def test_heuristics_agree_between_states():
+    heuristics = [EccentricityHeuristic(), ColorCountHeuristic(), CombinationHeuristic(), NodeCountHeuristic(),
+                  LayeredHeuristic(), LookaheadHeuristic()]
+    rng = random.Random(4)
+    for matrix in random_boards(5, 6, 5, seed=4):
+        states = [FillZoneGraphState(matrix), FillZoneBitboardState(matrix), FillZoneSharedState(matrix)]
+        while not states[0].is_solution():
+            for heuristic in heuristics:
+                assert len({heuristic.calculate(s) for s in states}) == 1
+            assert states[1].get_layers() and len(states[1].get_layers()) == EccentricityHeuristic.calculate(states[1])
+            action = rng.choice(sorted(states[0].get_possible_actions(), key=lambda a: a.get_color()))
+            states = [s.apply(action) for s in states]
+
+
+def test_stronger_heuristics_are_admissible():
+    for matrix in random_boards(5, 5, 5, seed=5):
+        expected = SearchTree(FillZoneBitboardState(matrix), DummyHeuristic()).search(BfsAlgorithm())
+        for heuristic in [LayeredHeuristic(), LookaheadHeuristic()]:
+            assert heuristic.calculate(FillZoneBitboardState(matrix)) <= expected.cost
+            result = SearchTree(FillZoneBitboardState(matrix), heuristic).search(AStarAlgorithm())
+            assert result.cost == expected.cost
+
+
+def test_cached_heuristic_is_bounded_and_counts_lookups():
+    hits = 0
+    for matrix in random_boards(3, 6, 4, seed=6):
+        expected = SearchTree(FillZoneBitboardState(matrix), LayeredHeuristic()).search(AStarAlgorithm())
+        heuristic = CachedHeuristic(LayeredHeuristic(), 50)
+        result = SearchTree(FillZoneBitboardState(matrix), heuristic).search(AStarAlgorithm())
+        assert result.cost == expected.cost
+        assert result.cache_hits + result.cache_misses == expected.generated_nodes + 1
+        assert len(heuristic) <= 50
+        hits += result.cache_hits
+    assert hits > 0
+
+
+def test_lookahead_greedy_returns_valid_solutions():
+    for matrix in random_boards(3, 5, 4, seed=7):
+        optimal = SearchTree(FillZoneBitboardState(matrix), LayeredHeuristic()).search(AStarAlgorithm())
+        for state, score in [(FillZoneGraphState(matrix), REGIONS_SCORE), (FillZoneBitboardState(matrix), AREA_SCORE)]:
+            result = SearchTree(state, DummyHeuristic()).search(LookaheadGreedyAlgorithm(3, score))
+            assert result.cost == len(result.solution) >= optimal.cost
+            assert result.first_solution_time is not None
+            assert result.status == SOLVED
+            assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+    matrix = random_boards(1, 14, 6, seed=8)[0]
+    algorithm = LookaheadGreedyAlgorithm(6)
+    algorithm.set_budget(SearchBudget(max_expanded=1000))
+    result = SearchTree(FillZoneBitboardState(matrix), DummyHeuristic()).search(algorithm)
+    assert result.status == MAX_EXPANDED
+    assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+
+def test_budget_stops_search_with_partial_solution():
+    matrix = random_boards(1, 10, 6, seed=9)[0]
+    limits = [(SearchBudget(max_expanded=200), MAX_EXPANDED), (SearchBudget(max_frontier=500), MAX_FRONTIER),
+              (SearchBudget(max_seconds=0), MAX_SECONDS)]
+    for budget, reason in limits:
+        algorithms = [BfsAlgorithm(), AStarAlgorithm()]
+        if reason != MAX_FRONTIER:
+            # Their frontiers stay small, a depth first search finds a solution too soon on its own
+            algorithms += [IdaStarAlgorithm(), BeamSearchAlgorithm(50)]
+        for algorithm in algorithms:
+            algorithm.set_budget(budget)
+            result = SearchTree(FillZoneBitboardState(matrix), ColorCountHeuristic()).search(algorithm)
+            assert result.status == reason
+            assert result.is_empty()
+            if reason == MAX_EXPANDED:
+                assert result.expanded_nodes == 200
+            if reason == MAX_FRONTIER:
+                assert result.frontier_nodes >= 500
+            assert result.partial_solution is not None
+
+    result = SearchTree(FillZoneBitboardState(matrix), ColorCountHeuristic()).search(AStarAlgorithm())
+    assert result.status == SOLVED
+
+    # An anytime search keeps its best solution, with the limit as status
+    algorithm = AraStarAlgorithm()
+    algorithm.set_budget(SearchBudget(max_expanded=5000))
+    result = SearchTree(FillZoneBitboardState(matrix), ColorCountHeuristic()).search(algorithm)
+    assert result.status == MAX_EXPANDED
+    assert result.expanded_nodes == 5000
+    assert result.suboptimality_bound > 1
+    assert Board([row[:] for row in matrix]).check_solution(result.solution)
+
+
+def test_memory_budget_only_counts_what_the_search_uses():
+    matrix = random_boards(1, 10, 6, seed=9)[0]
+    for algorithm in [BfsAlgorithm(), AStarAlgorithm()]:
+        algorithm.set_budget(SearchBudget(max_memory_mb=1))
+        result = SearchTree(FillZoneBitboardState(matrix), ColorCountHeuristic()).search(algorithm)
+        assert result.status == MAX_MEMORY_MB
+        assert result.partial_solution is not None
+
+    # An earlier task of the same process used far more than the limit, the next search must not be stopped
+    allocation = bytearray(200 * 1024 * 1024)
+    del allocation
+    for matrix in random_boards(2, 5, 4):
+        algorithm = AStarAlgorithm()
+        algorithm.set_budget(SearchBudget(max_memory_mb=100))
+        result = SearchTree(FillZoneBitboardState(matrix), ColorCountHeuristic()).search(algorithm)
+        assert result.status == SOLVED
+
+def test_batch_streams_one_result_per_board():
+    config = {"game": "fill-zone", "board_settings": {"state": "bitboard"},
+              "search_settings": {"algorithm": "A*", "heuristic": "combination"}}
+    boards = random_boards(3, 5, 4, seed=12)
+    lines = [json.dumps({"id": i, "board": b}) for i, b in enumerate(boards)] + ["not json",
+                                                                              '{"board": "0,1;1,("}']
+    out = io.StringIO()
+    run_batch(config, lines, out)
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["id"] for r in results] == [0, 1, 2, 3, 4]
+    for matrix, result in zip(boards, results):
+        expected = SearchTree(FillZoneBitboardState(matrix), CombinationHeuristic()).search(AStarAlgorithm())
+        assert result["status"] == SOLVED
+        assert result["cost"] == expected.cost
+        assert Board([row[:] for row in matrix]).check_solution([FillZoneAction(c) for c in result["solution"]])
+    assert results[3]["status"] == results[4]["status"] == TASK_ERROR
+
+
+def test_batch_reads_a_line_only_after_writing_the_previous_result():
+    config = {"game": "fill-zone", "board_settings": {"state": "bitboard"},
+              "search_settings": {"algorithm": "A*", "heuristic": "combination"}}
+    out = io.StringIO()
+
+    def lines():
+        for i, board in enumerate(random_boards(3, 5, 4, seed=13)):
+            assert len(out.getvalue().splitlines()) == i
+            yield json.dumps({"id": i, "board": board})
+            yield "\n"
+
+    run_batch(config, lines(), out)
+    assert [json.loads(line)["id"] for line in out.getvalue().splitlines()] == [0, 1, 2]
+
+
+def test_bidirectional_search_is_rejected_for_fill_zone():
+    for algorithm in ["bidirectional_bfs", "bidirectional_A*"]:
+        config = {"game": "fill-zone", "board_settings": {"type": "static", "board": "0,1;1,2"},
+                  "search_settings": {"algorithm": algorithm}}
+        with pytest.raises(ValueError, match="8-puzzle"):
+            run_fill_zone(config)
+        with pytest.raises(ValueError, match="8-puzzle"):
+            run_batch(config, ['{"board": "0,1;1,2"}'], io.StringIO())
+
+
+def test_record_algorithms_are_rejected_for_states_without_records():
+    for algorithm in RECORD_ALGORITHMS:
+        config = {"game": "fill-zone", "board_settings": {"type": "static", "board": "0,1;1,2"},
+                  "search_settings": {"algorithm": algorithm}}
+        with pytest.raises(ValueError, match="bitboard or shared"):
+            run_fill_zone(config)
+        with pytest.raises(ValueError, match="bitboard or shared"):
+            run_batch(config, ['{"board": "0,1;1,2"}'], io.StringIO())
+
+        config = {"game": "8-puzzle", "board_settings": {"board": "5,7,3;8,2,None;1,6,4",
+                                                      "goal": "1,2,3;8,None,4;7,6,5"},
+                  "search_settings": {"algorithm": algorithm}}
+        with pytest.raises(ValueError, match="packed"):
+            run_eight_puzzle(config)
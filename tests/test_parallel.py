@@ -0,0 +1,38 @@
+import os
+import time
+
+from src.budget import MAX_SECONDS, MAX_MEMORY_MB
+from src.parallel import ParallelSolver, TASK_CRASHED, TASK_ERROR
+from src.result import Result, SOLVED
+
+
+def solve(task: str) -> Result:
+    match task:
+        case "crash":
+            os._exit(1)
+        case "hang":
+            time.sleep(60)
+        case "allocate":
+            bytearray(512 * 1024 * 1024)
+        case "raise":
+            raise ValueError("bad board")
+    return Result(len(task), 1, 0, [])
+
+
+def test_parallel_solver_isolates_failing_tasks():
+    tasks = ["a", "crash", "bb", "hang", "allocate", "raise", "ccc"]
+    solver = ParallelSolver(solve, workers=3, task_timeout=2, max_memory_mb=256)
+    outcomes = list(solver.run(tasks))
+
+    assert [o.index for o in outcomes] == list(range(len(tasks)))
+    assert [o.status for o in outcomes] == [SOLVED, TASK_CRASHED, SOLVED, MAX_SECONDS, MAX_MEMORY_MB, TASK_ERROR,
+                                            SOLVED]
+    assert [o.result.cost for o in outcomes if o.result is not None] == [1, 2, 3]
+
+
+def test_parallel_solver_unordered_returns_every_task():
+    tasks = ["hang", "a", "bb"]
+    outcomes = list(ParallelSolver(solve, workers=2, task_timeout=1, ordered=False).run(tasks))
+    assert sorted(o.index for o in outcomes) == [0, 1, 2]
+    # The hanging task is the last one to finish
+    assert outcomes[-1].index == 0
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from typing import Dict
+
+from src.board_parser import parse_matrix
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Microseconds main may take to import, numpy alone takes about half of it
+IMPORT_TIME_BUDGET = 250000
+HEAVY_MODULES = ["numpy", "networkx", "matplotlib"]
+
+
+def get_import_times(statement: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds of every module imported by statement, from -X importtime"""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT_DIR,
+                             capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_main_does_not_import_heavy_modules():
+    times = get_import_times("import main")
+    assert [m for m in times if m.split(".")[0] in HEAVY_MODULES] == []
+    assert times["main"] < IMPORT_TIME_BUDGET
+
+
+def test_eight_puzzle_search_does_not_import_heavy_modules():
+    times = get_import_times("import main; main.run_eight_puzzle(main.json.load(open('config_8_puzzle.example.json')))")
+    assert [m for m in times if m.split(".")[0] in HEAVY_MODULES] == []
+
+
+def test_parse_matrix():
+    assert parse_matrix("4,5;3 0") == [[4, 5], [3, 0]]
+    assert parse_matrix("1,2;8,None") == [[1, 2], [8, None]]
+    assert parse_matrix([[1, 2], [3, 4]]) == [[1, 2], [3, 4]]